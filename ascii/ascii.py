@@ -6,11 +6,18 @@ A python program that convert images to ASCII art.
 Author: Mahesh Venkitachalam
 """
 
-import sys, random, argparse
+import sys, os, glob, json, time, random, argparse
+import multiprocessing, functools
 import numpy as np
 import math
 
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
+
+# summed-area tables, from the common directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import tilestats
+from frames import readFrames
 
 # gray scale level values from: 
 # http://paulbourke.net/dataformats/asciiart/
@@ -31,64 +38,250 @@ def getAverageL(image):
     # get average
     return np.average(im.reshape(w*h))
 
-def covertImageToAscii(fileName, cols, scale, moreLevels):
+def tileGrid(W, H, cols, scale):
     """
-    Given Image and dims (rows, cols) returns an m*n list of Images 
+    Given image dims, cols and scale, returns the x and y tile edges
     """
-    # declare globals
-    global gscale1, gscale2
-    # open image and convert to grayscale
-    image = Image.open(fileName).convert('L')
-    # store dimensions
-    W, H = image.size[0], image.size[1]
-    print("input image dims: %d x %d" % (W, H))
     # compute width of tile
     w = W/cols
     # compute tile height based on aspect ratio and scale
     h = w/scale
     # compute number of rows
     rows = int(H/h)
+    # tile edges, with the last tiles stretched to the image border
+    xs = (np.arange(cols + 1)*w).astype(int)
+    xs[-1] = W
+    ys = (np.arange(rows + 1)*h).astype(int)
+    ys[-1] = H
+    return xs, ys
+
+def tileMeans(im, xs, ys):
+    """
+    Given grayscale image array and tile edges, returns the integer
+    average luminance of every tile
+    """
+    # sum rows of tiles, then columns of tiles, in one pass each
+    sums = np.add.reduceat(im, ys[:-1], axis=0, dtype=np.int64)
+    sums = np.add.reduceat(sums, xs[:-1], axis=1)
+    # number of pixels in each tile
+    counts = np.outer(np.diff(ys), np.diff(xs))
+    # exact integer floor, same as int() of the float average
+    return sums//counts
+
+def meansToAscii(means, moreLevels):
+    """
+    Given tile averages, returns the ascii image as a list of strings
+    """
+    # look up all ascii chars at once
+    if moreLevels:
+        gscale, levels = gscale1, 69
+    else:
+        gscale, levels = gscale2, 9
+    lut = np.frombuffer(gscale.encode(), np.uint8)
+    chars = lut[(means*levels)//255]
+    return [row.tobytes().decode() for row in chars]
+
+def covertImageToAscii(fileName, cols, scale, moreLevels,
+                       cacheDir=tilestats.CACHE_DIR):
+    """
+    Given Image and dims (rows, cols) returns an m*n list of Images 
+    """
+    # summed-area table of the grayscale image, cached across runs
+    stats = tilestats.loadTileStats(fileName, 'L', cacheDir)
+    # store dimensions
+    W, H = stats.W, stats.H
+    print("input image dims: %d x %d" % (W, H))
+    # compute tile edges
+    xs, ys = tileGrid(W, H, cols, scale)
+    rows = len(ys) - 1
+    w = W/cols
     
     print("cols: %d, rows: %d" % (cols, rows))
-    print("tile dims: %d x %d" % (w, h))
+    print("tile dims: %d x %d" % (w, w/scale))
 
     # check if image size is too small
     if cols > W or rows > H:
         print("Image too small for specified cols!")
         exit(0)
 
-    # ascii image is a list of character strings
-    aimg = []
-    # generate list of dimensions
-    for j in range(rows):
-        y1 = int(j*h)
-        y2 = int((j+1)*h)
-        # correct last tile
-        if j == rows-1:
-            y2 = H
-        # append an empty string
-        aimg.append("")
-        for i in range(cols):
-            # crop image to tile
-            x1 = int(i*w)
-            x2 = int((i+1)*w)
-            # correct last tile
-            if i == cols-1:
-                x2 = W
-            # crop image to extract tile
-            img = image.crop((x1, y1, x2, y2))
-            # get average luminance
-            avg = int(getAverageL(img))
-            # look up ascii char
-            if moreLevels:
-                gsval = gscale1[int((avg*69)/255)]
-            else:
-                gsval = gscale2[int((avg*9)/255)]
-            # append ascii char to string
-            aimg[j] += gsval
+    # average all tiles of the image from the table, with the exact
+    # integer floor of tileMeans
+    means = stats.gridSums(xs, ys)//stats.gridCounts(xs, ys)
     
     # return txt image
-    return aimg
+    return meansToAscii(means, moreLevels)
+
+@functools.lru_cache(maxsize=8)
+def glyphMatrix(chars, sw, sh, fontFile=None, fontSize=16):
+    """
+    Renders each char as dark ink on white, downsampled to sw x sh
+    pixels. Returns a (len(chars), sh*sw) float32 matrix of the glyphs
+    and their squared norms. Cached, since the glyph set rarely changes.
+    """
+    if fontFile:
+        font = ImageFont.truetype(fontFile, fontSize)
+    else:
+        font = ImageFont.load_default()
+    # one cell size for all glyphs, so they keep their relative placement
+    boxes = [font.getbbox(c) for c in chars]
+    cw = max(1, max(box[2] for box in boxes))
+    ch = max(1, max(box[3] for box in boxes))
+    G = np.zeros((len(chars), sh*sw), np.float32)
+    for k, c in enumerate(chars):
+        img = Image.new('L', (cw, ch), 255)
+        ImageDraw.Draw(img).text((0, 0), c, fill=0, font=font)
+        G[k] = np.asarray(img.resize((sw, sh), Image.BOX)).reshape(-1)
+    return G, (G*G).sum(axis=1)
+
+def bestGlyphs(T, G, norms):
+    """
+    Given (tiles, d) tile pixels, returns the index of the nearest glyph
+    of G for each tile. |t - g|^2 = |t|^2 - 2 t.g + |g|^2, and |t|^2 is
+    the same for all glyphs, so one matrix multiply scores every pair.
+    """
+    return np.argmin(norms - 2.0*(T @ G.T), axis=1)
+
+def matchGlyphs(im, cols, scale, chars=gscale1, fontFile=None, sh=10):
+    """
+    Given grayscale image array, returns ascii rows picking for each
+    tile the glyph whose shape best matches the tile's pixels
+    """
+    H, W = im.shape
+    xs, ys = tileGrid(W, H, cols, scale)
+    rows = len(ys) - 1
+    # same limit as covertImageToAscii()
+    if cols > W or rows > H:
+        raise ValueError("Image too small for specified cols!")
+    # sub-pixels per tile, with the tile's aspect ratio
+    sw = max(2, int(round(sh*scale)))
+    # area-average the image down to sw x sh pixels per tile
+    small = np.asarray(Image.fromarray(im).resize((cols*sw, rows*sh),
+                                                  Image.BOX), np.float32)
+    # stretch contrast, so edges in dull images still pick shaped glyphs
+    lo, hi = np.percentile(small, [1, 99])
+    if hi > lo:
+        small = np.clip((small - lo)*(255.0/(hi - lo)), 0, 255)
+    # one row of sh*sw pixels per tile
+    T = small.reshape(rows, sh, cols, sw).transpose(0, 2, 1, 3)
+    T = T.reshape(rows*cols, sh*sw)
+    G, norms = glyphMatrix(chars, sw, sh, fontFile)
+    # even the darkest glyph is mostly paper - map black to its level
+    darkest = G.mean(axis=1).min()
+    T = darkest + T*((255.0 - darkest)/255.0)
+    index = bestGlyphs(T, G, norms).reshape(rows, cols)
+    lut = np.frombuffer(chars.encode(), np.uint8)
+    return [row.tobytes().decode() for row in lut[index]]
+
+def convertBatchFile(task):
+    """
+    Pool worker - given (fileName, cols, scale, moreLevels) returns
+    (fileName, ascii rows, error message)
+    """
+    fileName, cols, scale, moreLevels = task
+    try:
+        image = Image.open(fileName).convert('L')
+    except OSError as e:
+        return fileName, None, str(e)
+    W, H = image.size
+    xs, ys = tileGrid(W, H, cols, scale)
+    if cols > W or len(ys) - 1 > H:
+        return fileName, None, 'image too small for specified cols'
+    means = tileMeans(np.asarray(image), xs, ys)
+    return fileName, meansToAscii(means, moreLevels), None
+
+def convertBatch(fileNames, cols, scale, moreLevels, outDir=None,
+                 jsonlFile=None, workers=None):
+    """
+    Converts many images with a pool of worker processes. Each result is
+    written as soon as it arrives, either to outDir/<file name>.txt or as a
+    line of jsonlFile. Returns images/second.
+    """
+    tasks = [(fileName, cols, scale, moreLevels) for fileName in fileNames]
+    if jsonlFile:
+        jf = open(jsonlFile, 'w')
+    elif not os.path.exists(outDir):
+        os.makedirs(outDir)
+    start = time.time()
+    done = 0
+    pool = None
+    if workers == 1:
+        results = map(convertBatchFile, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        # small images convert fast, so hand them out in chunks
+        chunk = max(1, len(tasks)//(4*(workers or os.cpu_count())))
+        results = pool.imap(convertBatchFile, tasks, chunk)
+    for fileName, aimg, error in results:
+        if error:
+            print("skipping %s: %s" % (fileName, error))
+            continue
+        if jsonlFile:
+            jf.write(json.dumps({'file': fileName, 'rows': aimg}) + '\n')
+        else:
+            # keep the extension, so cat.png and cat.jpg don't collide
+            name = os.path.basename(fileName)
+            with open(os.path.join(outDir, name + '.txt'), 'w') as f:
+                f.write('\n'.join(aimg) + '\n')
+        done += 1
+    if pool:
+        pool.close()
+        pool.join()
+    if jsonlFile:
+        jf.close()
+    elapsed = max(time.time() - start, 1e-9)
+    print("%d images converted in %.2f s: %.1f images/s" %
+          (done, elapsed, done/elapsed))
+    return done/elapsed
+
+def streamAscii(frames, cols, scale, moreLevels, fps=24, out=sys.stdout):
+    """
+    Renders frames as ASCII art in the terminal at the target fps.
+    Only rows that changed since the last frame are redrawn, using
+    cursor positioning codes. Frames are dropped if rendering falls
+    behind. Returns the number of frames shown.
+    """
+    # tile edges for each frame size seen
+    grids = {}
+    prev = []
+    shown = dropped = 0
+    # hide cursor and clear screen
+    out.write('\x1b[?25l\x1b[2J')
+    start = time.time()
+    try:
+        for frameNum, im in enumerate(frames):
+            due = start + frameNum/fps
+            now = time.time()
+            if now > due + 1.0/fps:
+                # more than a frame late - skip this one
+                dropped += 1
+                continue
+            if now < due:
+                time.sleep(due - now)
+            H, W = im.shape
+            if (W, H) not in grids:
+                grids[W, H] = tileGrid(W, H, cols, scale)
+            xs, ys = grids[W, H]
+            aimg = meansToAscii(tileMeans(im, xs, ys), moreLevels)
+            # redraw only changed rows, terminal rows count from 1
+            buf = []
+            for j, row in enumerate(aimg):
+                if j >= len(prev) or prev[j] != row:
+                    buf.append('\x1b[%d;1H%s' % (j + 1, row))
+            # clear rows left over from a taller previous frame
+            if len(prev) > len(aimg):
+                buf.append('\x1b[%d;1H\x1b[J' % (len(aimg) + 1))
+            out.write(''.join(buf))
+            out.flush()
+            prev = aimg
+            shown += 1
+    finally:
+        # move below the picture and show cursor
+        out.write('\x1b[%d;1H\x1b[?25h' % (len(prev) + 1))
+        out.flush()
+    elapsed = max(time.time() - start, 1e-9)
+    print("%d frames shown, %d dropped: %.1f fps" %
+          (shown, dropped, shown/elapsed))
+    return shown
 
 # main() function
 def main():
@@ -96,14 +289,36 @@ def main():
     descStr = "This program converts an image into ASCII art."
     parser = argparse.ArgumentParser(description=descStr)
     # add expected arguments
-    parser.add_argument('--file', dest='imgFile', required=True)
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('--file', dest='imgFile')
+    inputs.add_argument('--input-dir', dest='inputDir')
+    inputs.add_argument('--stream', dest='stream')
     parser.add_argument('--scale', dest='scale', required=False)
     parser.add_argument('--out', dest='outFile', required=False)
     parser.add_argument('--cols', dest='cols', required=False)
     parser.add_argument('--morelevels',dest='moreLevels',action='store_true')
+    parser.add_argument('--no-cache', dest='noCache', action='store_true')
+    # match glyph shapes instead of average luminance
+    parser.add_argument('--glyphs', dest='glyphs', action='store_true')
+    parser.add_argument('--font', dest='fontFile', required=False)
+    # batch mode
+    parser.add_argument('--glob', dest='pattern', required=False)
+    parser.add_argument('--out-dir', dest='outDir', required=False)
+    parser.add_argument('--jsonl', dest='jsonlFile', required=False)
+    parser.add_argument('--workers', dest='workers', required=False)
+    # streaming mode
+    parser.add_argument('--fps', dest='fps', required=False)
 
     # parse args
     args = parser.parse_args()
+    # glyph matching converts a single file, from its pixels
+    if args.glyphs and not args.imgFile:
+        parser.error('--glyphs works with --file only')
+    if args.glyphs and (args.moreLevels or args.noCache):
+        parser.error('--glyphs can not be used with --morelevels or '
+                     '--no-cache')
+    if args.fontFile and not args.glyphs:
+        parser.error('--font needs --glyphs')
   
     imgFile = args.imgFile
     # set output file
@@ -119,9 +334,48 @@ def main():
     if args.cols:
         cols = int(args.cols)
 
+    # play a video file or directory of frames in the terminal
+    if args.stream:
+        fps = 24.0
+        if args.fps:
+            fps = float(args.fps)
+        try:
+            frames = readFrames(args.stream)
+        except (OSError, ValueError) as e:
+            print(e)
+            exit(0)
+        streamAscii(frames, cols, scale, args.moreLevels, fps)
+        return
+
+    # convert all matching images in the directory
+    if args.inputDir:
+        pattern = args.pattern or '*'
+        fileNames = sorted(f for f in
+                           glob.glob(os.path.join(args.inputDir, pattern))
+                           if os.path.isfile(f))
+        workers = None
+        if args.workers:
+            workers = int(args.workers)
+        print('generating ASCII art for %d files...' % len(fileNames))
+        convertBatch(fileNames, cols, scale, args.moreLevels,
+                     args.outDir or 'ascii-out', args.jsonlFile, workers)
+        return
+
     print('generating ASCII art...')
     # convert image to ascii txt
-    aimg = covertImageToAscii(imgFile, cols, scale, args.moreLevels)
+    if args.glyphs:
+        im = np.asarray(Image.open(imgFile).convert('L'))
+        print("input image dims: %d x %d" % (im.shape[1], im.shape[0]))
+        try:
+            aimg = matchGlyphs(im, cols, scale, fontFile=args.fontFile)
+        except ValueError as e:
+            print(e)
+            exit(0)
+        print("cols: %d, rows: %d" % (cols, len(aimg)))
+    else:
+        cacheDir = None if args.noCache else tilestats.CACHE_DIR
+        aimg = covertImageToAscii(imgFile, cols, scale, args.moreLevels,
+                                  cacheDir)
 
     # open file
     f = open(outFile, 'w')
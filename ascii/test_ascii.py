@@ -0,0 +1,143 @@
+"""
+test_ascii.py
+
+Checks the vectorized ASCII conversion against a tile by tile version.
+
+Author: Mahesh Venkitachalam
+"""
+
+import os, io, json
+import numpy as np
+import pytest
+from PIL import Image
+
+import ascii
+
+def asciiByTile(image, cols, scale, moreLevels):
+    """reference - crops and averages each tile separately"""
+    W, H = image.size
+    w = W/cols
+    h = w/scale
+    rows = int(H/h)
+    aimg = []
+    for j in range(rows):
+        y1 = int(j*h)
+        y2 = H if j == rows-1 else int((j+1)*h)
+        aimg.append("")
+        for i in range(cols):
+            x1 = int(i*w)
+            x2 = W if i == cols-1 else int((i+1)*w)
+            avg = int(ascii.getAverageL(image.crop((x1, y1, x2, y2))))
+            if moreLevels:
+                aimg[j] += ascii.gscale1[int((avg*69)/255)]
+            else:
+                aimg[j] += ascii.gscale2[int((avg*9)/255)]
+    return aimg
+
+def test_tiles(tmp_path):
+    np.random.seed(1)
+    # sizes that leave uneven last rows and columns
+    for W, H, cols in [(203, 157, 37), (640, 480, 80), (99, 301, 13)]:
+        im = np.random.randint(0, 256, (H, W)).astype(np.uint8)
+        fileName = str(tmp_path / 'test.png')
+        Image.fromarray(im).save(fileName)
+        cacheDir = str(tmp_path / 'cache')
+        # the second conversion reads the cached summed-area table
+        for moreLevels in [False, True]:
+            assert ascii.covertImageToAscii(fileName, cols, 0.43, moreLevels,
+                                            cacheDir) \
+                == asciiByTile(Image.fromarray(im), cols, 0.43, moreLevels)
+    # tables are cached as uint32, and old ones are dropped when it's full
+    cached = sorted(os.listdir(cacheDir))
+    with np.load(os.path.join(cacheDir, cached[0])) as data:
+        assert data['sums'].dtype == np.uint32
+    ascii.tilestats.pruneCache(cacheDir, 0)
+    assert os.listdir(cacheDir) == []
+
+def test_variance(tmp_path):
+    np.random.seed(5)
+    for mode, shape in [('L', (97, 131)), ('RGB', (64, 80, 3))]:
+        im = np.random.randint(0, 256, shape).astype(np.uint8)
+        fileName = str(tmp_path / ('test-%s.png' % mode))
+        Image.fromarray(im).save(fileName)
+        cacheDir = str(tmp_path / 'cache')
+        xs, ys = ascii.tileGrid(im.shape[1], im.shape[0], 9, 0.43)
+        ref = [[im[y1:y2, a:b].reshape(-1, *im.shape[2:]).var(axis=0)
+                for a, b in zip(xs[:-1], xs[1:])]
+               for y1, y2 in zip(ys[:-1], ys[1:])]
+        X1, Y1 = np.meshgrid(xs[:-1], ys[:-1])
+        X2, Y2 = np.meshgrid(xs[1:], ys[1:])
+        # built from the image, then with squares read from the cache
+        stats = ascii.tilestats.loadTileStats(fileName, mode, cacheDir)
+        assert np.allclose(stats.variance(X1, Y1, X2, Y2), ref)
+        stats = ascii.tilestats.loadTileStats(fileName, mode, cacheDir)
+        assert stats.squares is not None and stats.im is None
+        assert np.allclose(stats.variance(X1, Y1, X2, Y2), ref)
+        assert np.allclose(stats.mean(X1, Y1, X2, Y2),
+                           stats.gridMeans(xs, ys))
+
+def test_image():
+    fileName = os.path.join(os.path.dirname(__file__), 'data', 'a.jpg')
+    image = Image.open(fileName).convert('L')
+    assert ascii.covertImageToAscii(fileName, 80, 0.43, True, None) == \
+        asciiByTile(image, 80, 0.43, True)
+
+def test_batch(tmp_path):
+    np.random.seed(2)
+    fileNames = []
+    for k in range(5):
+        fileName = str(tmp_path / ('img%d.png' % k))
+        im = np.random.randint(0, 256, (90 + k, 120 + 7*k)).astype(np.uint8)
+        Image.fromarray(im).save(fileName)
+        fileNames.append(fileName)
+    jsonlFile = str(tmp_path / 'out.jsonl')
+    ascii.convertBatch(fileNames, 30, 0.43, False, jsonlFile=jsonlFile,
+                       workers=2)
+    with open(jsonlFile) as f:
+        results = [json.loads(line) for line in f]
+    assert [r['file'] for r in results] == fileNames
+    for r in results:
+        assert r['rows'] == ascii.covertImageToAscii(r['file'], 30, 0.43,
+                                                     False, None)
+    # same name, different formats - one text file each
+    Image.open(fileNames[1]).save(str(tmp_path / 'img0.jpg'))
+    outDir = str(tmp_path / 'out')
+    ascii.convertBatch([fileNames[0], str(tmp_path / 'img0.jpg')], 30, 0.43,
+                       False, outDir, workers=1)
+    assert sorted(os.listdir(outDir)) == ['img0.jpg.txt', 'img0.png.txt']
+
+def test_stream():
+    np.random.seed(3)
+    a = np.random.randint(0, 256, (120, 160)).astype(np.uint8)
+    b = a.copy()
+    # change only the first row of tiles
+    b[:9] = 255 - b[:9]
+    out = io.StringIO()
+    assert ascii.streamAscii([a, a, b], 40, 0.43, False, fps=20,
+                             out=out) == 3
+    text = out.getvalue()
+    # first frame draws every row, the repeat none and b only row 1,
+    # then the cursor moves below the picture
+    xs, ys = ascii.tileGrid(160, 120, 40, 0.43)
+    nRows = len(ys) - 1
+    assert text.count('\x1b[1;1H') == 2
+    assert text.count('\x1b[2;1H') == 1
+    assert text.count(';1H') == nRows + 1 + 1
+
+def test_glyphs():
+    np.random.seed(4)
+    G, norms = ascii.glyphMatrix(ascii.gscale1, 4, 10)
+    # batched scores pick the same glyphs as a search per tile
+    T = np.random.uniform(0, 255, (500, 40)).astype(np.float32)
+    best = [np.argmin(((G - t)**2).sum(axis=1)) for t in T]
+    assert np.array_equal(ascii.bestGlyphs(T, G, norms), best)
+    # a glyph's own pixels match it, or an identical looking glyph
+    index = ascii.bestGlyphs(G, G, norms)
+    assert np.array_equal(G[index], G)
+    im = np.random.randint(0, 256, (300, 400)).astype(np.uint8)
+    aimg = ascii.matchGlyphs(im, 120, 0.43)
+    assert len(aimg) == len(ascii.tileGrid(400, 300, 120, 0.43)[1]) - 1
+    assert all(len(row) == 120 for row in aimg)
+    # more columns than pixels
+    with pytest.raises(ValueError):
+        ascii.matchGlyphs(im[:, :100], 120, 0.43)
@@ -6,9 +6,18 @@ Creating Autostereograms
 Author: Mahesh Venkitachalam
 """
 
-import sys, random, argparse
+import sys, os, time, random, argparse, subprocess, threading, queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from PIL import Image, ImageDraw
 
+import meshdepth
+# image sequences, from the common directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+from frames import readFrames
+
 # create spacing/depth example
 def createSpacingDepthExample():
     tiles = [Image.open('test/a.png'), Image.open('test/b.png'), 
@@ -20,40 +29,50 @@ def createSpacingDepthExample():
             img.paste(tile, (10 + i*(100 + j*10), 10 + j*100))
     img.save('sdepth.png')
 
-# create image filled with random dots
-def createRandomTile(dims):
-  # create image
-  img = Image.new('RGB', dims)
-  draw = ImageDraw.Draw(img)
+# create image filled with random dots - dots are stamped all at once
+# with array indexing, and seed makes the tile reproducible
+def createRandomTile(dims, seed=None):
+  rng = np.random.default_rng(seed)
+  W, H = dims
   # calculate radius - % of min dimension 
   r = int(min(*dims)/100)
   # number of dots
   n = 1000
-  # draw random circles
-  for i in range(n):
-    # -r is used so circle stays inside - cleaner for tiling
-    x, y = random.randint(0, dims[0]-r), random.randint(0, dims[1]-r)
-    fill = (random.randint(0, 255), random.randint(0, 255), 
-            random.randint(0, 255))
-    draw.ellipse((x-r, y-r, x+r, y+r), fill)
+  # -r is used so circle stays inside - cleaner for tiling
+  x = rng.integers(0, W - r, n, endpoint=True)
+  y = rng.integers(0, H - r, n, endpoint=True)
+  fill = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+  # pixel offsets of a disc of radius r
+  dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+  inside = dx*dx + dy*dy <= r*r
+  dx, dy = dx[inside], dy[inside]
+  # every pixel of every dot, clipped to the image
+  xs = (x[:, None] + dx).ravel()
+  ys = (y[:, None] + dy).ravel()
+  colors = np.repeat(fill, len(dx), axis=0)
+  keep = (xs >= 0) & (xs < W) & (ys >= 0) & (ys < H)
+  img = np.zeros((H, W, 3), np.uint8)
+  # later dots cover earlier ones, as when drawn one by one
+  img[ys[keep], xs[keep]] = colors[keep]
   # return image
-  return img
+  return Image.fromarray(img)
 
-# Create a larger image of size dims by tiling the given image
-def createTiledImage(tile, dims):
-  # create output image
-  img = Image.new('RGB', dims)
+# Create a larger array of size dims by tiling the given image
+def tileArray(tile, dims):
   W, H = dims
   w, h = tile.size
   # calculate # of tiles needed
   cols = int(W/w) + 1
   rows = int(H/h) + 1
-  # paste tiles
-  for i in range(rows):
-    for j in range(cols):
-      img.paste(tile, (j*w, i*h))
-  # output image
-  return img
+  # repeat tile across one strip, then the strip down the image - cutting
+  # rows off the end keeps the array contiguous, so no copy is made
+  t = np.asarray(tile.convert('RGB'))
+  strip = np.tile(t, (1, cols, 1))[:, :W]
+  return np.tile(strip, (rows, 1, 1))[:H]
+
+# Create a larger image of size dims by tiling the given image
+def createTiledImage(tile, dims):
+  return Image.fromarray(tileArray(tile, dims))
 
 # create a depth map for testing:
 def createDepthMap(dims):
@@ -85,10 +104,11 @@ def createDepthShiftedImage(dmap, img):
   return sImg
 
 # Given a depth map (image) and an input image, create a new image
-# with pixels shifted according to depth
-def createAutostereogram(dmap, tile):
+# with pixels shifted according to depth - one pixel at a time,
+# kept as the reference for createAutostereogram
+def createAutostereogramPixels(dmap, tile):
   # convert depth map to single channel if needed
-  if dmap.mode is not 'L':
+  if dmap.mode != 'L':
     dmap = dmap.convert('L')
   # if no tile specified, use random image
   if not tile:
@@ -111,6 +131,184 @@ def createAutostereogram(dmap, tile):
   # return shifted image
   return sImg
 
+# shift given rows (a slice or row indices) of img into out based on
+# depth map, where w is the tile width - same result as the per-pixel
+# loop of createAutostereogramPixels
+def shiftRows(depth, img, out, w, rows):
+  d = depth[rows].astype(np.int64)
+  cols = d.shape[1]
+  i = np.arange(cols)
+  # 10*xpos, so bounds and truncation are exact integer operations
+  t = 10*(i - w) + d
+  src = np.where((t > 0) & (t < 10*cols), t//10, i)
+  # a pixel copied from the left takes that pixel's final value, so
+  # follow the copies back to a pixel that reads the tiled image
+  # directly - by pointer jumping, halving the chains every pass
+  parent = np.where(src < i, src, i)
+  while True:
+    nxt = np.take_along_axis(parent, parent, axis=1)
+    if np.array_equal(nxt, parent):
+      break
+    parent = nxt
+  col = np.take_along_axis(src, parent, axis=1)
+  out[rows] = np.take_along_axis(img[rows], col[..., None], axis=1)
+
+# shift the given row indices on a thread pool, a few bands per thread
+# to balance the load
+def shiftRowsPool(pool, workers, depth, img, out, w, rows):
+  bands = np.array_split(rows, min(len(rows), 4*workers))
+  jobs = [pool.submit(shiftRows, depth, img, out, w, band)
+          for band in bands if len(band)]
+  for job in jobs:
+    job.result()
+
+# Given a depth map (image) and an input image, create a new image
+# with pixels shifted according to depth. Rows are independent, so
+# bands of rows are shifted on a pool of threads.
+def createAutostereogram(dmap, tile, workers=None):
+  # convert depth map to single channel if needed
+  if dmap.mode != 'L':
+    dmap = dmap.convert('L')
+  # if no tile specified, use random image
+  if not tile:
+    tile = createRandomTile((100, 100))
+  # create an image by tiling
+  img = tileArray(tile, dmap.size)
+  depth = np.asarray(dmap)
+  out = np.empty_like(img)
+  workers = workers or os.cpu_count()
+  with ThreadPoolExecutor(workers) as pool:
+    shiftRowsPool(pool, workers, depth, img, out, tile.size[0],
+                  np.arange(depth.shape[0]))
+  # return shifted image
+  return Image.fromarray(out)
+
+# Writes frames on a background thread, to a video file through an
+# ffmpeg pipe or as numbered PNGs in a directory, so encoding overlaps
+# computing the next frame
+class FrameWriter:
+  def __init__(self, outPath, fps=30):
+    self.outPath = outPath
+    self.fps = fps
+    self.proc = None
+    self.isVideo = os.path.splitext(outPath)[1].lower() in \
+        ['.mp4', '.mov', '.mkv', '.avi']
+    # fail here, not later in the writer thread
+    if self.isVideo:
+      if shutil.which('ffmpeg') is None:
+        raise FileNotFoundError('ffmpeg is needed to write %s' % outPath)
+    else:
+      os.makedirs(outPath, exist_ok=True)
+    # first error of the writer thread, raised by write() and close()
+    self.error = None
+    # a couple of frames in flight, bounding memory use
+    self.queue = queue.Queue(maxsize=2)
+    self.thread = threading.Thread(target=self.writer)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def writer(self):
+    while True:
+      item = self.queue.get()
+      if item is None:
+        break
+      # after an error keep taking frames, so write() never blocks
+      if self.error is not None:
+        continue
+      frameNum, frame = item
+      try:
+        if self.isVideo:
+          self.proc.stdin.write(frame.tobytes())
+        else:
+          fileName = os.path.join(self.outPath, 'frame_%06d.png' % frameNum)
+          Image.fromarray(frame).save(fileName)
+      except Exception as e:
+        self.error = e
+
+  # raise the writer thread's error, if any
+  def checkError(self):
+    if self.error is not None:
+      error, self.error = self.error, None
+      raise error
+
+  # queue a frame - the writer owns it from now on
+  def write(self, frameNum, frame):
+    self.checkError()
+    if self.isVideo and self.proc is None:
+      # frame size is known once the first frame arrives
+      H, W = frame.shape[:2]
+      cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d' % (W, H),
+             '-r', str(self.fps), '-i', '-',
+             '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', self.outPath]
+      self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    self.queue.put((frameNum, frame))
+
+  # wait for all frames to be written
+  def close(self):
+    if self.thread.is_alive():
+      self.queue.put(None)
+      self.thread.join()
+    if self.proc:
+      try:
+        self.proc.stdin.close()
+      except OSError as e:
+        self.error = self.error or e
+      if self.proc.wait() and self.error is None:
+        self.error = RuntimeError('ffmpeg failed writing %s' % self.outPath)
+      self.proc = None
+    self.checkError()
+
+# Given a sequence of depth maps (arrays), create an autostereogram for
+# each and pass it to writer. The tiled background is made once, and
+# only rows whose depth changed since the last frame are shifted again.
+# Returns the number of frames.
+def createAutostereogramSequence(dmaps, tile, writer, workers=None):
+  # if no tile specified, use random image
+  if not tile:
+    tile = createRandomTile((100, 100))
+  workers = workers or os.cpu_count()
+  img = out = prev = None
+  frames = rowsShifted = rowsTotal = 0
+  start = time.time()
+  # close the writer even if a frame fails, so ffmpeg and the writer
+  # thread don't outlive the sequence
+  try:
+    with ThreadPoolExecutor(workers) as pool:
+      for depth in dmaps:
+        H, W = depth.shape
+        if img is None or img.shape[:2] != (H, W):
+          # create an image by tiling, once per frame size
+          img = tileArray(tile, (W, H))
+          out = np.empty_like(img)
+          prev = None
+        else:
+          # the writer still owns the previous frame
+          out = out.copy()
+        if prev is None:
+          rows = np.arange(H)
+        else:
+          rows = np.nonzero((depth != prev).any(axis=1))[0]
+        if len(rows):
+          shiftRowsPool(pool, workers, depth, img, out, tile.size[0], rows)
+        writer.write(frames, out)
+        prev = depth
+        frames += 1
+        rowsShifted += len(rows)
+        rowsTotal += H
+  except BaseException:
+    # the first error is the one to report
+    try:
+      writer.close()
+    except Exception:
+      pass
+    raise
+  writer.close()
+  elapsed = max(time.time() - start, 1e-9)
+  print('%d frames in %.2f s: %.1f frames/s, %.1f%% of rows shifted' %
+        (frames, elapsed, frames/elapsed, 100.0*rowsShifted/max(rowsTotal, 1)))
+  return frames
+
 # main() function
 def main():
   # use sys.argv if needed
@@ -118,23 +316,70 @@ def main():
   # create parser
   parser = argparse.ArgumentParser(description="Autosterograms...")
   # add expected arguments
-  parser.add_argument('--depth', dest='dmFile', required=True)
+  inputs = parser.add_mutually_exclusive_group(required=True)
+  inputs.add_argument('--depth', dest='dmFile')
+  # directory or video of depth maps, for an animated sequence
+  inputs.add_argument('--depth-seq', dest='dmSeq')
+  # OBJ or PLY mesh, rendered to a depth map
+  inputs.add_argument('--mesh', dest='meshFile')
+  parser.add_argument('--size', dest='size', nargs=2, required=False)
+  parser.add_argument('--eye', dest='eye', nargs=3, required=False)
+  parser.add_argument('--fov', dest='fov', required=False)
+  parser.add_argument('--save-depth', dest='depthOut', required=False)
   parser.add_argument('--tile', dest='tileFile', required=False)
   parser.add_argument('--out', dest='outFile', required=False)
+  parser.add_argument('--workers', dest='workers', required=False)
+  parser.add_argument('--fps', dest='fps', required=False)
+  parser.add_argument('--seed', dest='seed', required=False)
   # parse args
   args = parser.parse_args()
-  # set output file
-  outFile = 'as.png'
-  if args.outFile:
-      outFile = args.outFile
   # set tile
   tileFile = False
   if args.tileFile:
       tileFile = Image.open(args.tileFile)
-  # open depth map
-  dmImg = Image.open(args.dmFile)
+  elif args.seed:
+      # reproducible random dot tile
+      tileFile = createRandomTile((100, 100), int(args.seed))
+  workers = None
+  if args.workers:
+      workers = int(args.workers)
+  # animated sequence, written to a video file or frame directory
+  if args.dmSeq:
+    fps = 30
+    if args.fps:
+      fps = int(args.fps)
+    try:
+      dmaps = readFrames(args.dmSeq)
+      writer = FrameWriter(args.outFile or 'as-frames', fps)
+    except (OSError, ValueError) as e:
+      print(e)
+      exit(0)
+    createAutostereogramSequence(dmaps, tileFile, writer, workers)
+    return
+  # set output file
+  outFile = 'as.png'
+  if args.outFile:
+      outFile = args.outFile
+  if args.meshFile:
+    # render depth map of mesh
+    dims = (800, 600)
+    if args.size:
+      dims = (int(args.size[0]), int(args.size[1]))
+    eye = None
+    if args.eye:
+      eye = [float(v) for v in args.eye]
+    fov = None
+    if args.fov:
+      fov = float(args.fov)
+    dmImg = meshdepth.createMeshDepthMapFile(args.meshFile, dims, eye=eye,
+                                             fov=fov)
+    if args.depthOut:
+      dmImg.save(args.depthOut)
+  else:
+    # open depth map
+    dmImg = Image.open(args.dmFile)
   # create stereogram
-  asImg = createAutostereogram(dmImg, tileFile)
+  asImg = createAutostereogram(dmImg, tileFile, workers)
   # write output
   asImg.save(outFile)
 
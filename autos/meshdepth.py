@@ -0,0 +1,269 @@
+"""
+meshdepth.py
+
+Depth maps for autostereograms from 3D meshes
+
+Author: Mahesh Venkitachalam
+
+Loads a triangle mesh from an OBJ or PLY file and renders it with a
+software z-buffer into an 'L' depth map, nearest surfaces brightest.
+Triangles are rasterized in batches: they are bucketed by the size of
+their screen bounding box, and each batch tests all candidate pixels
+of all its triangles at once with numpy.
+"""
+
+import math
+import numpy as np
+from PIL import Image
+
+# load vertices (n, 3) and triangles (m, 3) from a Wavefront OBJ file -
+# polygons are split into triangle fans
+def loadOBJ(fileName):
+  verts = []
+  faces = []
+  with open(fileName) as f:
+    for line in f:
+      if line.startswith('v '):
+        verts.append([float(v) for v in line.split()[1:4]])
+      elif line.startswith('f '):
+        # v, v/vt, v//vn or v/vt/vn - 1-based, negative from the end
+        idx = [int(v.split('/')[0]) for v in line.split()[1:]]
+        idx = [i - 1 if i > 0 else len(verts) + i for i in idx]
+        for k in range(1, len(idx) - 1):
+          faces.append((idx[0], idx[k], idx[k + 1]))
+  return (np.array(verts, np.float64).reshape(-1, 3),
+          np.array(faces, np.int64).reshape(-1, 3))
+
+# PLY property types to numpy types
+plyTypes = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+            'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+            'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+            'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+# names of the PLY face property listing vertex indices
+faceProps = ['vertex_indices', 'vertex_index']
+
+# load vertices (n, 3) and triangles (m, 3) from an ASCII or binary PLY
+# file - polygons are split into triangle fans
+def loadPLY(fileName):
+  with open(fileName, 'rb') as f:
+    if f.readline().strip() != b'ply':
+      raise ValueError('%s is not a PLY file' % fileName)
+    fmt = None
+    # [name, count, [(property, type, list count type)]]
+    elements = []
+    while True:
+      words = f.readline().decode().split()
+      if not words or words[0] == 'end_header':
+        break
+      if words[0] == 'format':
+        fmt = words[1]
+      elif words[0] == 'element':
+        elements.append([words[1], int(words[2]), []])
+      elif words[0] == 'property':
+        if words[1] == 'list':
+          elements[-1][2].append((words[4], plyTypes[words[3]],
+                                  plyTypes[words[2]]))
+        else:
+          elements[-1][2].append((words[2], plyTypes[words[1]], None))
+    if fmt == 'ascii':
+      data = f.read().decode().split()
+    else:
+      data = f.read()
+      order = '<' if fmt == 'binary_little_endian' else '>'
+  verts = faces = None
+  pos = 0
+  for name, count, props in elements:
+    isList = any(p[2] for p in props)
+    if fmt == 'ascii':
+      if not isList:
+        n = len(props)
+        rows = np.array(data[pos:pos + n*count], np.float64).reshape(count, n)
+        pos += n*count
+        cols = {p[0]: rows[:, k] for k, p in enumerate(props)}
+      else:
+        # one record per line - read each list's count, then its items
+        lists = []
+        for i in range(count):
+          for prop, typ, countType in props:
+            if countType:
+              k = int(data[pos])
+              if prop in faceProps:
+                lists.append([int(v) for v in data[pos + 1:pos + 1 + k]])
+              pos += 1 + k
+            else:
+              pos += 1
+        cols = {'faces': lists}
+    else:
+      if not isList:
+        dtype = np.dtype([(p[0], order + p[1]) for p in props])
+        rows = np.frombuffer(data, dtype, count, pos)
+        pos += dtype.itemsize*count
+        cols = {p[0]: rows[p[0]].astype(np.float64) for p in props}
+      else:
+        # a single list of all triangles reads as fixed size records
+        rows = None
+        listProps = [p[0] for p in props if p[2]]
+        if len(listProps) == 1 and listProps[0] in faceProps:
+          fields = []
+          for prop, typ, countType in props:
+            if countType:
+              fields += [(prop + 'n', order + countType),
+                         (prop, order + typ, 3)]
+            else:
+              fields.append((prop, order + typ))
+          tri = np.dtype(fields)
+          listProp = listProps[0]
+          if pos + tri.itemsize*count <= len(data):
+            rows = np.frombuffer(data, tri, count, pos)
+            if not np.all(rows[listProp + 'n'] == 3):
+              rows = None
+        if rows is not None:
+          pos += tri.itemsize*count
+          cols = {'faces': rows[listProp].astype(np.int64)}
+        else:
+          # mixed polygons - walk the records one by one
+          lists = []
+          for i in range(count):
+            for prop, typ, countType in props:
+              if countType:
+                k = int(np.frombuffer(data, order + countType, 1, pos)[0])
+                pos += np.dtype(countType).itemsize
+                if prop in faceProps:
+                  lists.append(np.frombuffer(data, order + typ, k, pos))
+                pos += np.dtype(typ).itemsize*k
+              else:
+                pos += np.dtype(typ).itemsize
+          cols = {'faces': lists}
+    if name == 'vertex':
+      verts = np.stack([cols['x'], cols['y'], cols['z']], axis=1)
+    elif name == 'face':
+      faces = cols['faces']
+  if not isinstance(faces, np.ndarray):
+    # split polygons into triangle fans
+    faces = [(p[0], p[k], p[k + 1]) for p in faces
+             for k in range(1, len(p) - 1)]
+  return verts, np.array(faces, np.int64).reshape(-1, 3)
+
+# load a mesh by file extension
+def loadMesh(fileName):
+  if fileName.lower().endswith('.obj'):
+    return loadOBJ(fileName)
+  if fileName.lower().endswith('.ply'):
+    return loadPLY(fileName)
+  raise ValueError('unknown mesh format: %s' % fileName)
+
+# project vertices to screen: returns pixel x, y and camera depth.
+# The camera looks from eye at target; with no eye it looks down -z
+# at the mesh centre. fov (degrees) gives a perspective projection,
+# otherwise it is orthographic and the mesh is scaled to fit.
+def project(verts, dims, eye=None, target=None, up=(0, 1, 0), fov=None):
+  W, H = dims
+  lo, hi = verts.min(axis=0), verts.max(axis=0)
+  if target is None:
+    target = (lo + hi)/2
+  target = np.asarray(target, np.float64)
+  radius = max(np.linalg.norm(hi - lo)/2, 1e-12)
+  if eye is None:
+    eye = target + (0, 0, 3*radius)
+  eye = np.asarray(eye, np.float64)
+  # camera axes
+  f = target - eye
+  f /= np.linalg.norm(f)
+  r = np.cross(f, up)
+  if np.linalg.norm(r) < 1e-9:
+    # looking along up - pick any other right vector
+    r = np.cross(f, (1, 0, 0))
+  r /= np.linalg.norm(r)
+  u = np.cross(r, f)
+  p = verts - eye
+  x, y, z = p @ r, p @ u, p @ f
+  if fov:
+    focal = (H/2)/math.tan(math.radians(fov)/2)
+    # points behind the camera get z <= 0 and are dropped later
+    zs = np.where(z > 1e-9, z, 1e-9)
+    sx, sy = focal*x/zs, focal*y/zs
+  else:
+    # centre the mesh and fit it across the view, with a margin
+    cx, cy = (x.max() + x.min())/2, (y.max() + y.min())/2
+    ext = max((x.max() - x.min())/W, (y.max() - y.min())/H, 1e-12)
+    sx, sy = (x - cx)/ext*0.9, (y - cy)/ext*0.9
+  return W/2 + sx, H/2 - sy, z
+
+# rasterize triangles into a z-buffer: returns (H, W) camera depths,
+# inf where nothing was drawn. batchSize bounds the number of pixel
+# tests made at once.
+def rasterize(px, py, pz, faces, dims, perspective=False, batchSize=1 << 21):
+  W, H = dims
+  zbuf = np.full(H*W, np.inf)
+  # drop triangles behind a perspective camera
+  if perspective:
+    faces = faces[(pz[faces] > 1e-9).all(axis=1)]
+  x, y = px[faces], py[faces]
+  # interpolate z, or 1/z for a perspective camera - the one that is
+  # linear in screen space
+  q = 1.0/pz[faces] if perspective else pz[faces]
+  # pixel bounds of each triangle (pixel centres at +0.5), on screen
+  x0 = np.maximum(np.ceil(x.min(axis=1) - 0.5), 0).astype(np.int64)
+  x1 = np.minimum(np.floor(x.max(axis=1) - 0.5), W - 1).astype(np.int64)
+  y0 = np.maximum(np.ceil(y.min(axis=1) - 0.5), 0).astype(np.int64)
+  y1 = np.minimum(np.floor(y.max(axis=1) - 0.5), H - 1).astype(np.int64)
+  # twice the signed area - either winding is drawn
+  area = ((x[:, 1] - x[:, 0])*(y[:, 2] - y[:, 0]) -
+          (x[:, 2] - x[:, 0])*(y[:, 1] - y[:, 0]))
+  keep = (x1 >= x0) & (y1 >= y0) & (np.abs(area) > 1e-12)
+  # bucket triangles by the power of 2 that covers their bounding box
+  size = np.maximum(x1 - x0, y1 - y0) + 1
+  bucket = np.zeros(len(size), np.int64)
+  bucket[keep] = np.ceil(np.log2(size[keep])).astype(np.int64)
+  for b in np.unique(bucket[keep]):
+    s = 1 << int(b)
+    sel = np.nonzero(keep & (bucket == b))[0]
+    # candidate pixel offsets within an s x s box
+    oy, ox = np.divmod(np.arange(s*s), s)
+    step = max(1, batchSize//(s*s))
+    for k in range(0, len(sel), step):
+      t = sel[k:k + step]
+      cx = x0[t, None] + ox
+      cy = y0[t, None] + oy
+      # pixel centres
+      fx, fy = cx + 0.5, cy + 0.5
+      xt, yt, a = x[t], y[t], area[t, None]
+      # barycentric weights from edge functions
+      w0 = ((xt[:, 1, None] - fx)*(yt[:, 2, None] - fy) -
+            (xt[:, 2, None] - fx)*(yt[:, 1, None] - fy))/a
+      w1 = ((xt[:, 2, None] - fx)*(yt[:, 0, None] - fy) -
+            (xt[:, 0, None] - fx)*(yt[:, 2, None] - fy))/a
+      w2 = 1.0 - w0 - w1
+      inside = ((w0 >= 0) & (w1 >= 0) & (w2 >= 0) &
+                (cx <= x1[t, None]) & (cy <= y1[t, None]))
+      qt = q[t]
+      d = w0*qt[:, 0, None] + w1*qt[:, 1, None] + w2*qt[:, 2, None]
+      if perspective:
+        d = 1.0/d
+      # nearest surface wins
+      np.minimum.at(zbuf, (cy*W + cx)[inside], d[inside])
+  return zbuf.reshape(H, W)
+
+# render a mesh into an 'L' depth map of given dims: background is 0,
+# and surfaces run from far (farthest) to near (nearest)
+def createMeshDepthMap(verts, faces, dims, eye=None, target=None,
+                       up=(0, 1, 0), fov=None, far=64, near=255):
+  px, py, pz = project(verts, dims, eye, target, up, fov)
+  zbuf = rasterize(px, py, pz, faces, dims, perspective=bool(fov))
+  hit = np.isfinite(zbuf)
+  dmap = np.zeros(zbuf.shape, np.uint8)
+  if hit.any():
+    zn, zf = zbuf[hit].min(), zbuf[hit].max()
+    if zf - zn > 1e-12:
+      t = (zf - zbuf[hit])/(zf - zn)
+    else:
+      # flat - everything is nearest
+      t = 1.0
+    dmap[hit] = np.round(far + t*(near - far)).astype(np.uint8)
+  return Image.fromarray(dmap)
+
+# load a mesh file and render its depth map
+def createMeshDepthMapFile(fileName, dims, **kwargs):
+  verts, faces = loadMesh(fileName)
+  return createMeshDepthMap(verts, faces, dims, **kwargs)
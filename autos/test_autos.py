@@ -0,0 +1,178 @@
+"""
+test_autos.py
+
+Checks the row-vectorized autostereogram against the per-pixel one.
+
+Author: Mahesh Venkitachalam
+"""
+
+import os
+import numpy as np
+import pytest
+from PIL import Image
+
+import autos
+import meshdepth
+
+dataDir = os.path.join(os.path.dirname(__file__), 'data')
+
+def checkSame(dmap, tile, workers=None):
+    ref = autos.createAutostereogramPixels(dmap, tile)
+    out = autos.createAutostereogram(dmap, tile, workers)
+    assert np.array_equal(np.asarray(out), np.asarray(ref))
+
+def test_depth_maps():
+    tile = autos.createRandomTile((100, 100), seed=1)
+    checkSame(Image.open(os.path.join(dataDir, 'dmap.png')), tile)
+    checkSame(Image.open(os.path.join(dataDir, 'shark-depth.png')), tile, 3)
+
+def test_random_depth():
+    np.random.seed(2)
+    dmap = Image.fromarray(np.random.randint(0, 256, (61, 230)).astype(np.uint8))
+    # narrow tiles also copy from pixels to the right
+    for w in [7, 20, 33]:
+        tile = Image.fromarray(np.random.randint(0, 256, (15, w, 3))
+                               .astype(np.uint8))
+        checkSame(dmap, tile, 2)
+
+class ListWriter:
+    """keeps written frames in memory"""
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frameNum, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        self.closed = True
+
+def test_sequence(tmp_path):
+    tile = autos.createRandomTile((50, 50), seed=3)
+    # a square moving down, so most rows stay the same between frames
+    dmaps = []
+    for k in range(6):
+        depth = np.zeros((120, 200), np.uint8)
+        depth[10 + 5*k:40 + 5*k, 60:120] = 200
+        dmaps.append(depth)
+    writer = ListWriter()
+    assert autos.createAutostereogramSequence(dmaps, tile, writer, 2) == 6
+    for depth, frame in zip(dmaps, writer.frames):
+        ref = autos.createAutostereogram(Image.fromarray(depth), tile)
+        assert np.array_equal(frame, np.asarray(ref))
+    # PNG frames in a directory
+    outDir = str(tmp_path / 'frames')
+    autos.createAutostereogramSequence(dmaps, tile,
+                                       autos.FrameWriter(outDir), 2)
+    assert len(os.listdir(outDir)) == 6
+    # bad output paths fail up front, write errors reach the caller
+    with pytest.raises(OSError):
+        autos.FrameWriter(os.path.join(outDir, 'frame_000000.png'))
+    writer = autos.FrameWriter(str(tmp_path / 'gone'))
+    os.rmdir(str(tmp_path / 'gone'))
+    with pytest.raises(OSError):
+        for k in range(6):
+            writer.write(k, np.zeros((4, 4, 3), np.uint8))
+        writer.close()
+    # a failing write still closes the writer
+    writer = ListWriter()
+    def failingWrite(frameNum, frame):
+        raise OSError('disk full')
+    writer.write = failingWrite
+    with pytest.raises(OSError):
+        autos.createAutostereogramSequence(dmaps, tile, writer, 2)
+    assert writer.closed
+    # sources that can't be read fail when opened
+    with pytest.raises(OSError):
+        autos.readFrames(str(tmp_path / 'missing.mp4'))
+    assert len(list(autos.readFrames(outDir))) == 6
+
+def test_tiles():
+    # same seed, same tile
+    a = autos.createRandomTile((100, 80), seed=5)
+    assert a.size == (100, 80)
+    assert np.array_equal(np.asarray(a),
+                          np.asarray(autos.createRandomTile((100, 80), seed=5)))
+    # tiling matches pasting the tile over and over
+    tile = Image.open(os.path.join(dataDir, 'escher-tile.jpg'))
+    dims = (333, 250)
+    ref = Image.new('RGB', dims)
+    w, h = tile.size
+    for i in range(int(dims[1]/h) + 1):
+        for j in range(int(dims[0]/w) + 1):
+            ref.paste(tile, (j*w, i*h))
+    assert np.array_equal(np.asarray(autos.createTiledImage(tile, dims)),
+                          np.asarray(ref))
+
+def rasterizeByPixel(px, py, pz, faces, dims):
+    """reference - tests every pixel against every triangle"""
+    W, H = dims
+    zbuf = np.full((H, W), np.inf)
+    for a, b, c in faces:
+        (x0, y0), (x1, y1), (x2, y2) = [(px[v], py[v]) for v in (a, b, c)]
+        area = (x1 - x0)*(y2 - y0) - (x2 - x0)*(y1 - y0)
+        if abs(area) <= 1e-12:
+            continue
+        for j in range(H):
+            for i in range(W):
+                fx, fy = i + 0.5, j + 0.5
+                w0 = ((x1 - fx)*(y2 - fy) - (x2 - fx)*(y1 - fy))/area
+                w1 = ((x2 - fx)*(y0 - fy) - (x0 - fx)*(y2 - fy))/area
+                w2 = 1.0 - w0 - w1
+                if w0 >= 0 and w1 >= 0 and w2 >= 0:
+                    z = w0*pz[a] + w1*pz[b] + w2*pz[c]
+                    zbuf[j, i] = min(zbuf[j, i], z)
+    return zbuf
+
+def test_rasterize():
+    np.random.seed(5)
+    dims = (40, 30)
+    # small and large triangles, some partly off screen
+    px = np.random.uniform(-10, 50, 60)
+    py = np.random.uniform(-10, 40, 60)
+    pz = np.random.uniform(1, 10, 60)
+    faces = np.random.randint(0, 60, (20, 3))
+    small = np.arange(60).reshape(20, 3)
+    px[small[10:]] = px[small[10:, :1]] + np.random.uniform(-3, 3, (10, 3))
+    zbuf = meshdepth.rasterize(px, py, pz, np.vstack([faces, small]), dims,
+                               batchSize=64)
+    ref = rasterizeByPixel(px, py, pz, np.vstack([faces, small]), dims)
+    assert np.array_equal(np.isfinite(zbuf), np.isfinite(ref))
+    assert np.allclose(zbuf[np.isfinite(ref)], ref[np.isfinite(ref)])
+
+def test_mesh_files(tmp_path):
+    # a unit cube from 6 quads
+    verts = np.array([(x, y, z) for x in (0, 1) for y in (0, 1)
+                      for z in (0, 1)], np.float64)
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+             (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    objFile = tmp_path / 'cube.obj'
+    with open(objFile, 'w') as f:
+        for v in verts:
+            f.write('v %g %g %g\n' % tuple(v))
+        for q in quads:
+            f.write('f %s\n' % ' '.join('%d//1' % (i + 1) for i in q))
+    v, tris = meshdepth.loadMesh(str(objFile))
+    assert np.array_equal(v, verts) and tris.shape == (12, 3)
+    header = ('ply\nformat %s 1.0\nelement vertex 8\nproperty float x\n'
+              'property float y\nproperty float z\nelement face 12\n'
+              'property list uchar int vertex_indices\nend_header\n')
+    plyFile = tmp_path / 'cube.ply'
+    with open(plyFile, 'w') as f:
+        f.write(header % 'ascii')
+        for p in v:
+            f.write('%g %g %g\n' % tuple(p))
+        for t in tris:
+            f.write('3 %d %d %d\n' % tuple(t))
+    assert all(np.array_equal(a, b) for a, b in
+               zip(meshdepth.loadMesh(str(plyFile)), (v, tris)))
+    binFile = tmp_path / 'cube-bin.ply'
+    face = np.zeros(12, [('n', 'u1'), ('idx', '<i4', 3)])
+    face['n'], face['idx'] = 3, tris
+    with open(binFile, 'wb') as f:
+        f.write((header % 'binary_little_endian').encode())
+        f.write(v.astype('<f4').tobytes() + face.tobytes())
+    assert all(np.array_equal(a, b) for a, b in
+               zip(meshdepth.loadMesh(str(binFile)), (v, tris)))
+    # looking down at the cube, its top face fills the middle of the map
+    dmap = np.asarray(meshdepth.createMeshDepthMap(v, tris, (60, 40)))
+    assert dmap[20, 30] == 255 and dmap[0, 0] == 0
@@ -6,7 +6,7 @@ Implementation of Craig Reynold's BOIDs
 Author: Mahesh Venkitachalam
 """
 
-import sys, argparse
+import sys, argparse, time
 import math
 import numpy as np
 import matplotlib.pyplot as plt 
@@ -14,41 +14,140 @@ import matplotlib.animation as animation
 from scipy.spatial.distance import squareform, pdist, cdist
 from numpy.linalg import norm
 
+from cellgrid import neighborSums
+from trajectory import TrajectoryWriter
+from flockstore import FlockStore
+
 width, height = 640, 480
 
 class Boids:
     """Class that represents Boids simulation"""
-    def __init__(self, N):
+    def __init__(self, N, engine='auto', width=width, height=height):
         """ initialize the Boid simulation"""
+        # size of the world
+        self.width, self.height = width, height
+        # float32 positions & velocities with room to spawn more boids
+        self.flock = FlockStore(max(N, 64))
+        self.mag = self.mask = None
+        # TrajectoryWriter recording each tick, if set
+        self.recorder = None
         # init position & velocities
-        self.pos = [width/2.0, height/2.0] + 10*np.random.rand(2*N).reshape(N, 2)
-        # normalized random velocities
-        angles = 2*math.pi*np.random.rand(N)
-        self.vel = np.array(list(zip(np.sin(angles), np.cos(angles))))
-        self.N = N
+        pos = [width/2.0, height/2.0] + 10*np.random.rand(2*N).reshape(N, 2)
+        self.spawn(pos)
         # min dist of approach
         self.minDist = 25.0
         # max magnitude of velocities calculated by "rules"
         self.maxRuleVel = 0.03
         # max maginitude of final velocity
         self.maxVel = 2.0
+        # 'dense' distance matrix, 'grid' of cells for big flocks, or
+        # 'auto' to pick dense up to denseMax boids
+        self.engine = engine
+        self.denseMax = 2000
+        # ticks stepped so far
+        self.ticks = 0
 
-    def tick(self, frameNum, pts, beak):
-        """Update the simulation by one time step."""
-        # get pairwise distances
-        self.distMatrix = squareform(pdist(self.pos))
-        # apply rules:
-        self.vel += self.applyRules()
-        self.limit(self.vel, self.maxVel)
-        self.pos += self.vel
-        self.applyBC()
-        # update data
+    @property
+    def N(self):
+        """number of active boids"""
+        return self.flock.n
+
+    @property
+    def pos(self):
+        return self.flock.pos
+
+    @pos.setter
+    def pos(self, pos):
+        if len(pos) != self.N:
+            raise ValueError('%d positions for %d boids' % (len(pos), self.N))
+        self.flock.pos[:] = pos
+
+    @property
+    def vel(self):
+        return self.flock.vel
+
+    @vel.setter
+    def vel(self, vel):
+        if len(vel) != self.N:
+            raise ValueError('%d velocities for %d boids' % (len(vel), self.N))
+        self.flock.vel[:] = vel
+
+    def setFlock(self, pos, vel):
+        """replaces all boids with (k, 2) pos and vel"""
+        if len(pos) != len(vel):
+            raise ValueError('%d positions but %d velocities' %
+                             (len(pos), len(vel)))
+        if len(pos) != self.N:
+            self.checkResize()
+        self.flock.resize(len(pos))
+        self.flock.pos[:] = pos
+        self.flock.vel[:] = vel
+        self.allocScratch()
+
+    def allocScratch(self):
+        """grow scratch buffers for limit() and applyBC() to the capacity"""
+        capacity = self.flock.capacity
+        if self.mag is None or len(self.mag) < capacity:
+            self.mag = np.empty(capacity)
+            self.mask = np.empty((capacity, 2), np.bool_)
+
+    def checkResize(self):
+        """trajectory files hold a fixed number of boids"""
+        if self.recorder:
+            raise ValueError('can not add or remove boids while recording')
+
+    def spawn(self, pos, vel=None):
+        """add boids at (k, 2) pos, with random unit velocities if no vel"""
+        self.checkResize()
+        pos = np.asarray(pos, np.float64).reshape(-1, 2)
+        if vel is None:
+            # normalized random velocities
+            angles = 2*math.pi*np.random.rand(len(pos))
+            vel = np.stack([np.sin(angles), np.cos(angles)], axis=1)
+        ids = self.flock.spawn(pos, vel)
+        self.allocScratch()
+        return ids
+
+    def despawn(self, indices):
+        """remove the boids at indices - the last boids fill their rows"""
+        self.checkResize()
+        self.flock.despawn(indices)
+
+    def step(self, n=1):
+        """Advance the simulation by n time steps, without drawing."""
+        for k in range(n):
+            # apply rules:
+            self.vel += self.ruleVelocity()
+            self.limit(self.vel, self.maxVel)
+            self.pos += self.vel
+            self.applyBC()
+            self.ticks += 1
+            if self.recorder:
+                self.recorder.append(self.pos, self.vel)
+
+    def ruleVelocity(self):
+        """velocity change from the rules, with the chosen engine"""
+        if self.engine == 'dense' or \
+                (self.engine == 'auto' and self.N <= self.denseMax):
+            # get pairwise distances
+            self.distMatrix = squareform(pdist(self.pos))
+            return self.applyRules()
+        return self.applyRulesGrid()
+
+    def draw(self, pts, beak):
+        """Update the plotted boids and their beaks."""
         pts.set_data(self.pos.reshape(2*self.N)[::2], 
                      self.pos.reshape(2*self.N)[1::2])
         vec = self.pos + 10*self.vel/self.maxVel
         beak.set_data(vec.reshape(2*self.N)[::2], 
                       vec.reshape(2*self.N)[1::2])
 
+    def tick(self, frameNum, pts, beak):
+        """Update the simulation by one time step."""
+        self.step()
+        # update data
+        self.draw(pts, beak)
+
     def limitVec(self, vec, maxVal):
         """limit magnitide of 2D vector"""
         mag = norm(vec)
@@ -56,56 +155,74 @@ class Boids:
             vec[0], vec[1] = vec[0]*maxVal/mag, vec[1]*maxVal/mag
     
     def limit(self, X, maxVal):
-        """limit magnitide of 2D vectors in array X to maxValue"""
-        for vec in X:
-            self.limitVec(vec, maxVal)
+        """limit magnitide of 2D vectors in array X to maxValue, in place"""
+        mag = self.mag[:len(X)]
+        np.hypot(X[:, 0], X[:, 1], out=mag)
+        # scale factor, 1 for vectors already short enough
+        np.maximum(mag, maxVal, out=mag)
+        np.divide(maxVal, mag, out=mag)
+        X *= mag[:, np.newaxis]
             
     def applyBC(self):
-        """apply boundary conditions"""
+        """apply boundary conditions - wrap around, in place"""
         deltaR = 2.0
-        for coord in self.pos:
-            if coord[0] > width + deltaR:
-                coord[0] = - deltaR
-            if coord[0] < - deltaR:
-                coord[0] = width + deltaR    
-            if coord[1] > height + deltaR:
-                coord[1] = - deltaR
-            if coord[1] < - deltaR:
-                coord[1] = height + deltaR
+        # past the far edge to the near one, then past the near edge
+        # to the far one
+        hi = (self.width + deltaR, self.height + deltaR)
+        mask = self.mask[:self.N]
+        np.greater(self.pos, hi, out=mask)
+        np.copyto(self.pos, -deltaR, where=mask)
+        np.less(self.pos, -deltaR, out=mask)
+        np.copyto(self.pos, hi, where=mask)
     
     def applyRules(self):
+        # sum in float64 - separation cancels large sums of positions
+        pos, vel0 = self.pos.astype(np.float64), self.vel.astype(np.float64)
         # apply rule #1 - Separation
         D = self.distMatrix < 25.0
-        vel = self.pos*D.sum(axis=1).reshape(self.N, 1) - D.dot(self.pos)
+        vel = pos*D.sum(axis=1).reshape(self.N, 1) - D.dot(pos)
         self.limit(vel, self.maxRuleVel)
 
         # different distance threshold
         D = self.distMatrix < 50.0
 
         # apply rule #2 - Alignment
-        vel2 = D.dot(self.vel)
+        vel2 = D.dot(vel0)
         self.limit(vel2, self.maxRuleVel)
         vel += vel2;
 
         # apply rule #1 - Cohesion
-        vel3 = D.dot(self.pos) - self.pos
+        vel3 = D.dot(pos) - pos
         self.limit(vel3, self.maxRuleVel)
         vel += vel3
 
         return vel
 
+    def applyRulesGrid(self):
+        """applyRules() from sums over neighbors found with a cell grid"""
+        pos, vel0 = self.pos.astype(np.float64), self.vel.astype(np.float64)
+        counts, sums = neighborSums(pos, [25.0, 50.0], [pos, vel0])
+        # rule #1 - Separation
+        vel = pos*counts[0].reshape(self.N, 1) - sums[0][0]
+        self.limit(vel, self.maxRuleVel)
+        # rule #2 - Alignment
+        vel2 = sums[1][1]
+        self.limit(vel2, self.maxRuleVel)
+        vel += vel2
+        # rule #3 - Cohesion
+        vel3 = sums[1][0] - pos
+        self.limit(vel3, self.maxRuleVel)
+        vel += vel3
+        return vel
+
     def buttonPress(self, event):
         """event handler for matplotlib button presses"""
         # left click - add a boid
         if event.button is 1:
-            self.pos = np.concatenate((self.pos, 
-                                       np.array([[event.xdata, event.ydata]])), 
-                                      axis=0)
-            # random velocity
-            angles = 2*math.pi*np.random.rand(1)
-            v = np.array(list(zip(np.sin(angles), np.cos(angles))))
-            self.vel = np.concatenate((self.vel, v), axis=0)
-            self.N += 1 
+            if self.recorder:
+                print('not adding a boid - the flock is being recorded')
+            else:
+                self.spawn([event.xdata, event.ydata])
         # right click - scatter
         elif event.button is 3:
             # add scattering velocity 
@@ -125,6 +242,11 @@ def main():
   parser = argparse.ArgumentParser(description="Implementing Craig Reynold's Boids...")
   # add arguments
   parser.add_argument('--num-boids', dest='N', required=False)
+  parser.add_argument('--engine', dest='engine', required=False,
+                      choices=['auto', 'dense', 'grid'])
+  parser.add_argument('--headless', action='store_true', required=False)
+  parser.add_argument('--steps', dest='steps', required=False)
+  parser.add_argument('--record', dest='recordFile', required=False)
   args = parser.parse_args()
 
   # number of boids
@@ -133,7 +255,23 @@ def main():
       N = int(args.N)
 
   # create boids
-  boids = Boids(N)
+  boids = Boids(N, args.engine or 'auto')
+  if args.recordFile:
+      boids.recorder = TrajectoryWriter(args.recordFile, N)
+
+  # step without a display
+  if args.headless:
+      steps = 1000
+      if args.steps:
+          steps = int(args.steps)
+      t0 = time.time()
+      boids.step(steps)
+      elapsed = max(time.time() - t0, 1e-9)
+      print('%d ticks of %d boids in %.2f s: %.1f ticks/s' %
+            (steps, N, elapsed, steps/elapsed))
+      if boids.recorder:
+          boids.recorder.close()
+      return
 
   # setup plot
   fig = plt.figure()
@@ -150,6 +288,8 @@ def main():
   cid = fig.canvas.mpl_connect('button_press_event', boids.buttonPress)
 
   plt.show()
+  if boids.recorder:
+      boids.recorder.close()
 
 # call main
 if __name__ == '__main__':
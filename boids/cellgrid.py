@@ -0,0 +1,97 @@
+"""
+cellgrid.py
+
+Neighbor sums for Boids using a uniform grid of cells (a cell list)
+
+Author: Mahesh Venkitachalam
+
+Boids are bucketed into square cells as wide as the largest radius, so
+the neighbors of a boid can only be in its own cell or the 8 around
+it. Candidate pairs from those cells are generated in bounded chunks
+with numpy, and sums over the neighbors within each radius are
+accumulated with np.bincount - the dense N x N distance matrix is never
+built.
+"""
+
+import numpy as np
+
+def cellList(pos, cellSize):
+    """
+    Returns (order, cellStart, cx, cy, nx, ny): boids sorted by cell,
+    where boids order[cellStart[c]:cellStart[c+1]] are in cell c, and
+    the cell coordinates of each sorted boid on an nx x ny grid
+    """
+    # offset so the lowest coordinates fall in cell 0
+    c = np.floor((pos - pos.min(axis=0))/cellSize).astype(np.int64)
+    nx, ny = c.max(axis=0) + 1
+    cell = c[:, 0]*ny + c[:, 1]
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell, minlength=nx*ny)
+    cellStart = np.zeros(nx*ny + 1, np.int64)
+    np.cumsum(counts, out=cellStart[1:])
+    return order, cellStart, c[order, 0], c[order, 1], nx, ny
+
+def neighborSums(pos, radii, values, budget=1 << 22):
+    """
+    For each radius r in radii and each boid i, counts the boids j with
+    |pos[j] - pos[i]| < r, and sums each (N, k) array of values over
+    them. Boid i is its own neighbor, as in the dense distance matrix.
+    Returns counts (len(radii), N) and sums, a list per radius of one
+    (N, k) array per value. At most budget candidate pairs are held in
+    memory at once.
+    """
+    N = len(pos)
+    counts = np.zeros((len(radii), N), np.int64)
+    sums = [[np.zeros(v.shape) for v in values] for r in radii]
+    if N == 0:
+        return counts, sums
+    order, cellStart, cx, cy, nx, ny = cellList(pos, max(radii))
+    # work on boids sorted by cell, for locality
+    sp = pos[order]
+    svals = [v[order] for v in values]
+    r2 = [r*r for r in radii]
+    # candidate range [start, end) of sorted boids for each of the 9 cells
+    # around each boid - empty where the cell is off the grid
+    starts = []
+    ends = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            x, y = cx + dx, cy + dy
+            valid = (x >= 0) & (x < nx) & (y >= 0) & (y < ny)
+            cell = np.where(valid, x*ny + y, 0)
+            starts.append(np.where(valid, cellStart[cell], 0))
+            ends.append(np.where(valid, cellStart[cell + 1], 0))
+    starts = np.array(starts)
+    lens = np.array(ends) - starts
+    # split the boids into chunks of at most budget candidate pairs
+    total = np.cumsum(lens.sum(axis=0))
+    bounds = np.searchsorted(total, np.arange(budget, total[-1], budget))
+    bounds = np.unique(np.concatenate(([0], bounds, [N])))
+    ssums = [[np.zeros(v.shape) for v in values] for r in radii]
+    scounts = np.zeros((len(radii), N), np.int64)
+    for b0, b1 in zip(bounds[:-1], bounds[1:]):
+        n = lens[:, b0:b1].ravel()
+        # expand ranges to pairs (i, j) of sorted boid indices
+        i = np.repeat(np.tile(np.arange(b0, b1), 9), n)
+        first = np.cumsum(n) - n
+        j = np.repeat(starts[:, b0:b1].ravel() - first, n) + \
+            np.arange(n.sum())
+        d = sp[j] - sp[i]
+        d2 = d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1]
+        # drop pairs beyond the largest radius first
+        near = d2 < max(r2)
+        i, j, d2 = i[near], j[near], d2[near]
+        for m in range(len(radii)):
+            near = d2 < r2[m]
+            im, jm = i[near], j[near]
+            scounts[m] += np.bincount(im, minlength=N)
+            for v, sv in enumerate(svals):
+                for k in range(sv.shape[1]):
+                    ssums[m][v][:, k] += np.bincount(im, sv[jm, k],
+                                                     minlength=N)
+    # back to the caller's boid order
+    counts[:, order] = scounts
+    for m in range(len(radii)):
+        for v in range(len(values)):
+            sums[m][v][order] = ssums[m][v]
+    return counts, sums
@@ -0,0 +1,276 @@
+"""
+domains.py
+
+Author: Mahesh Venkitachalam
+
+Steps a big Boids flock on several cores. The world is split into
+vertical strips (domains), one per worker by default, each stepped by
+a worker process. All boids live in shared memory, sorted by domain:
+a worker reads the boids it owns plus the ghost boids of its neighbor
+strips that are within 50 (the alignment/cohesion radius) of its
+edges, steps its own boids into a scratch buffer, and counts where
+they moved to. Boids that crossed into another strip then migrate
+there in a second pass, which copies each domain's boids straight to
+their slots for the next step.
+
+Run this file directly for strong- and weak-scaling benchmarks.
+"""
+
+import os, time, math, argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+import boids as boidsModule
+from boids import Boids
+
+# ghost zone width - the largest rule radius
+GHOST = 50.0
+
+# worker process state - shared boids (x, y, vx, vy, id), stepped
+# boids, their new domains, and a Boids object to run the rules
+workerBlocks = []
+workerArrays = {}
+workerBoids = []
+
+def attachWorker(names, N, engine, width, height):
+    """pool initializer - attaches the shared arrays"""
+    shapes = {'state': ((N, 5), np.float64), 'stepped': ((N, 5), np.float64),
+              'dest': ((N,), np.int64)}
+    for key, name in names.items():
+        shm = shared_memory.SharedMemory(name=name)
+        workerBlocks.append(shm)
+        shape, dtype = shapes[key]
+        workerArrays[key] = np.ndarray(shape, dtype, buffer=shm.buf)
+    workerBoids.append(Boids(0, engine, width, height))
+
+def stepDomain(task):
+    """steps the boids of domain k, returns counts of boids per new domain"""
+    k, starts, edges = task
+    S, T = workerArrays['state'], workerArrays['stepped']
+    P = len(starts) - 1
+    s0, s1 = starts[k], starts[k + 1]
+    parts = [S[s0:s1]]
+    # ghosts from the neighbor strips
+    if k > 0:
+        left = S[starts[k - 1]:s0]
+        parts.append(left[left[:, 0] >= edges[k] - GHOST])
+    if k < P - 1:
+        right = S[s1:starts[k + 2]]
+        parts.append(right[right[:, 0] < edges[k + 1] + GHOST])
+    local = np.concatenate(parts)
+    n = s1 - s0
+    b = workerBoids[0]
+    # rules from owned and ghost boids
+    b.setFlock(local[:, :2], local[:, 2:4])
+    rules = b.ruleVelocity()[:n]
+    # move the owned boids only
+    b.setFlock(local[:n, :2], local[:n, 2:4] + rules)
+    b.limit(b.vel, b.maxVel)
+    b.pos += b.vel
+    b.applyBC()
+    T[s0:s1, :2] = b.pos
+    T[s0:s1, 2:4] = b.vel
+    T[s0:s1, 4] = local[:n, 4]
+    dest = np.searchsorted(edges[1:-1], b.pos[:, 0], 'right')
+    workerArrays['dest'][s0:s1] = dest
+    return np.bincount(dest, minlength=P)
+
+def migrateDomain(task):
+    """copies the stepped boids of domain k to their next slots"""
+    k, s0, s1, offsets = task
+    S, T = workerArrays['state'], workerArrays['stepped']
+    dest = workerArrays['dest'][s0:s1]
+    # boids grouped by destination, keeping their order
+    order = np.argsort(dest, kind='stable')
+    counts = np.bincount(dest, minlength=len(offsets))
+    first = 0
+    for m, count in enumerate(counts):
+        if count:
+            S[offsets[m]:offsets[m] + count] = \
+                T[s0 + order[first:first + count]]
+            first += count
+
+class DomainBoids(Boids):
+    """Boids stepped on a process pool, one vertical strip per worker"""
+    def __init__(self, N, engine='auto', width=boidsModule.width,
+                 height=boidsModule.height, domainWidth=None, workers=None):
+        # no workers yet - Boids.__init__ spawns the flock
+        self.pool = None
+        self.blocks = []
+        Boids.__init__(self, N, engine, width, height)
+        if not workers:
+            workers = os.cpu_count()
+        if domainWidth:
+            # strips of at most domainWidth
+            self.domains = max(1, int(math.ceil(width/domainWidth)))
+        else:
+            # a strip per worker, as many as fit
+            self.domains = max(1, min(workers, int(width//GHOST)))
+        # strips narrower than the ghost zone would need ghosts from
+        # more than one neighbor
+        if self.domains > 1 and width/self.domains < GHOST:
+            raise ValueError('%d domains of a %g wide world are narrower '
+                             'than %g' % (self.domains, width, GHOST))
+        self.workers = min(workers, self.domains)
+
+    def start(self):
+        """allocates shared memory and starts the workers"""
+        N = self.N
+        sizes = {'state': N*5*8, 'stepped': N*5*8, 'dest': N*8}
+        self.blocks = {key: shared_memory.SharedMemory(create=True,
+                                                       size=max(1, size))
+                       for key, size in sizes.items()}
+        self.state = np.ndarray((N, 5), np.float64,
+                                buffer=self.blocks['state'].buf)
+        # equal width strips - the outer ones reach past the world edges
+        P = self.domains
+        self.edges = np.linspace(0, self.width, P + 1)
+        self.edges[0], self.edges[-1] = -np.inf, np.inf
+        self.pool = mp.Pool(self.workers, initializer=attachWorker,
+                            initargs=({key: shm.name for key, shm in
+                                       self.blocks.items()},
+                                      N, self.engine, self.width,
+                                      self.height))
+
+    def load(self):
+        """copies pos and vel to shared memory, sorted by domain"""
+        P = self.domains
+        dest = np.searchsorted(self.edges[1:-1], self.pos[:, 0], 'right')
+        order = np.argsort(dest, kind='stable')
+        self.state[:, :2] = self.pos[order]
+        self.state[:, 2:4] = self.vel[order]
+        self.state[:, 4] = order
+        self.starts = np.zeros(P + 1, np.int64)
+        np.cumsum(np.bincount(dest, minlength=P), out=self.starts[1:])
+
+    def step(self, n=1):
+        """Advance the simulation by n time steps, without drawing."""
+        if self.pool is None:
+            self.start()
+        # pos and vel may have been changed since the last step - a
+        # copy and sort per call, not per tick
+        self.load()
+        P = self.domains
+        for i in range(n):
+            tasks = [(k, self.starts, self.edges) for k in range(P)]
+            C = np.array(self.pool.map(stepDomain, tasks, chunksize=1))
+            # where each domain's boids go: after the boids that came
+            # to the same domain from lower numbered domains
+            newStarts = np.zeros(P + 1, np.int64)
+            np.cumsum(C.sum(axis=0), out=newStarts[1:])
+            offsets = newStarts[:-1] + np.cumsum(C, axis=0) - C
+            tasks = [(k, self.starts[k], self.starts[k + 1], offsets[k])
+                     for k in range(P)]
+            self.pool.map(migrateDomain, tasks, chunksize=1)
+            self.starts = newStarts
+            self.ticks += 1
+            if self.recorder:
+                self.sync()
+                self.recorder.append(self.pos, self.vel)
+        self.sync()
+
+    def sync(self):
+        """copies shared state back to pos and vel, in boid order"""
+        ids = self.state[:, 4].astype(np.int64)
+        self.pos[ids] = self.state[:, :2]
+        self.vel[ids] = self.state[:, 2:4]
+
+    def spawn(self, pos, vel=None):
+        """add boids - the shared memory is rebuilt on the next step"""
+        self.close()
+        return Boids.spawn(self, pos, vel)
+
+    def despawn(self, indices):
+        """remove boids - the shared memory is rebuilt on the next step"""
+        self.close()
+        Boids.despawn(self, indices)
+
+    def setFlock(self, pos, vel):
+        """replaces all boids - the shared memory is rebuilt if needed"""
+        if len(pos) != self.N:
+            self.close()
+        Boids.setFlock(self, pos, vel)
+
+    def domainSizes(self):
+        """returns the number of boids in each domain"""
+        return np.diff(self.starts)
+
+    def close(self):
+        """stops the workers and releases the shared memory"""
+        if self.pool is None:
+            return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+        self.state = None
+        for shm in self.blocks.values():
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+def spreadFlock(b):
+    """spreads boids uniformly over the world with random headings"""
+    b.pos = np.random.rand(b.N, 2)*[b.width, b.height]
+    angles = 2*np.pi*np.random.rand(b.N)
+    b.vel = np.stack([np.sin(angles), np.cos(angles)], axis=1)
+
+def timeSteps(N, domains, workers, steps):
+    """returns seconds per step of N boids spread over 640 x 480 domains"""
+    np.random.seed(0)
+    b = DomainBoids(N, 'grid', domains*boidsModule.width, boidsModule.height,
+                    boidsModule.width, workers)
+    spreadFlock(b)
+    # first step starts the pool
+    b.step()
+    start = time.time()
+    b.step(steps)
+    stepTime = (time.time() - start)/steps
+    b.close()
+    return stepTime
+
+def benchmark(N, maxWorkers, steps):
+    """
+    Prints strong scaling (a world of maxWorkers domains, more workers)
+    and weak scaling (one domain per worker), with N boids per domain
+    """
+    print('strong scaling: %d boids in %d domains, %d steps per run' %
+          (N*maxWorkers, maxWorkers, steps))
+    base = None
+    for workers in range(1, maxWorkers + 1):
+        t = timeSteps(N*maxWorkers, maxWorkers, workers, steps)
+        base = base or t
+        print('workers: %2d, step: %.4f s, speedup: %.2f, efficiency: %.2f' %
+              (workers, t, base/t, base/t/workers))
+    print('weak scaling: %d boids per domain' % N)
+    base = None
+    for workers in range(1, maxWorkers + 1):
+        t = timeSteps(N*workers, workers, workers, steps)
+        base = base or t
+        print('workers: %2d, boids: %d, step: %.4f s, efficiency: %.2f' %
+              (workers, N*workers, t, base/t))
+
+# main() function
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks multi-core "
+                                     "Boids stepping.")
+    parser.add_argument('--num-boids', dest='N', required=False)
+    parser.add_argument('--max-workers', dest='maxWorkers', required=False)
+    parser.add_argument('--steps', dest='steps', required=False)
+    args = parser.parse_args()
+
+    # boids per 640 x 480 domain
+    N = 20000
+    if args.N:
+        N = int(args.N)
+    maxWorkers = os.cpu_count()
+    if args.maxWorkers:
+        maxWorkers = int(args.maxWorkers)
+    steps = 5
+    if args.steps:
+        steps = int(args.steps)
+    benchmark(N, maxWorkers, steps)
+
+# call main
+if __name__ == '__main__':
+    main()
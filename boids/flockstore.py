@@ -0,0 +1,109 @@
+"""
+flockstore.py
+
+Author: Mahesh Venkitachalam
+
+Structure-of-arrays storage for a flock that grows and shrinks at run
+time. Positions, velocities and ids live in separate float32/int64
+arrays with spare capacity: the first n rows are the active boids.
+Spawning appends rows, doubling the capacity when it runs out, so
+inserts are O(1) amortized. Despawning fills each hole with a boid
+from the end (swap-remove), so the active rows stay packed without
+shifting the rest. Boid order is not kept - ids follow the boids.
+"""
+
+import numpy as np
+
+class FlockStore:
+    """Positions, velocities and ids of a flock, with spare capacity"""
+    def __init__(self, capacity=64, dtype=np.float32):
+        self.n = 0
+        self.posBuf = np.empty((max(1, capacity), 2), dtype)
+        self.velBuf = np.empty((max(1, capacity), 2), dtype)
+        self.ids = np.empty(max(1, capacity), np.int64)
+        # id of the next boid spawned
+        self.nextId = 0
+
+    @property
+    def capacity(self):
+        return len(self.posBuf)
+
+    @property
+    def pos(self):
+        """(n, 2) view of the active positions"""
+        return self.posBuf[:self.n]
+
+    @property
+    def vel(self):
+        """(n, 2) view of the active velocities"""
+        return self.velBuf[:self.n]
+
+    def activeIds(self):
+        """(n,) view of the ids of the active boids"""
+        return self.ids[:self.n]
+
+    def reserve(self, n):
+        """makes room for n boids, doubling the capacity as needed"""
+        if n <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < n:
+            capacity *= 2
+        for name in ('posBuf', 'velBuf', 'ids'):
+            old = getattr(self, name)
+            buf = np.empty((capacity,) + old.shape[1:], old.dtype)
+            buf[:self.n] = old[:self.n]
+            setattr(self, name, buf)
+
+    def resize(self, n):
+        """
+        sets the number of active boids - new rows get fresh ids, and
+        positions and velocities the caller must fill in
+        """
+        self.reserve(n)
+        if n > self.n:
+            self.ids[self.n:n] = np.arange(self.nextId,
+                                           self.nextId + n - self.n)
+            self.nextId += n - self.n
+        self.n = n
+
+    def spawn(self, pos, vel):
+        """appends boids (k, 2) pos and vel, returns their ids"""
+        pos = np.asarray(pos).reshape(-1, 2)
+        vel = np.asarray(vel).reshape(-1, 2)
+        if len(pos) != len(vel):
+            raise ValueError('%d positions but %d velocities' %
+                             (len(pos), len(vel)))
+        n0 = self.n
+        self.resize(n0 + len(pos))
+        self.posBuf[n0:self.n] = pos
+        self.velBuf[n0:self.n] = vel
+        return self.ids[n0:self.n].copy()
+
+    def despawn(self, indices):
+        """removes boids at the given active row indices (swap-remove)"""
+        idx = np.unique(np.asarray(indices, np.int64))
+        if len(idx) == 0:
+            return
+        if idx[0] < 0 or idx[-1] >= self.n:
+            raise IndexError('boid index out of range for %d boids' % self.n)
+        m = self.n - len(idx)
+        # holes below the new count are filled by the boids kept above it
+        holes = idx[idx < m]
+        keep = np.ones(self.n - m, np.bool_)
+        keep[idx[idx >= m] - m] = False
+        movers = m + np.nonzero(keep)[0]
+        for buf in (self.posBuf, self.velBuf, self.ids):
+            buf[holes] = buf[movers]
+        self.n = m
+
+    def indexOf(self, ids):
+        """returns the active row indices of boids with given ids"""
+        ids = np.asarray(ids, np.int64)
+        active = self.activeIds()
+        order = np.argsort(active)
+        k = np.searchsorted(active, ids, sorter=order)
+        k = np.minimum(k, max(self.n - 1, 0))
+        if self.n == 0 or not np.all(active[order[k]] == ids):
+            raise KeyError('no active boid with some of ids %s' % ids)
+        return order[k]
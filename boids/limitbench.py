@@ -0,0 +1,86 @@
+"""
+limitbench.py
+
+Microbenchmark of the Boids velocity limit and boundary wrap, comparing
+the per-boid Python loops with the in-place array versions.
+
+Author: Mahesh Venkitachalam
+"""
+
+import sys, argparse, time
+import numpy as np
+from numpy.linalg import norm
+
+import boids
+
+def limitLoop(X, maxVal):
+    """limit magnitude of each 2D vector in X - one row at a time"""
+    for vec in X:
+        mag = norm(vec)
+        if mag > maxVal:
+            vec[0], vec[1] = vec[0]*maxVal/mag, vec[1]*maxVal/mag
+
+def applyBCLoop(pos, width, height):
+    """wrap positions around the world - one coordinate at a time"""
+    deltaR = 2.0
+    for coord in pos:
+        if coord[0] > width + deltaR:
+            coord[0] = - deltaR
+        if coord[0] < - deltaR:
+            coord[0] = width + deltaR
+        if coord[1] > height + deltaR:
+            coord[1] = - deltaR
+        if coord[1] < - deltaR:
+            coord[1] = height + deltaR
+
+def timeIt(func, repeat):
+    """returns best time of func() over repeat runs"""
+    best = float('inf')
+    for k in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def benchmark(sizes, repeat=5):
+    """prints loop vs array times of limit() and applyBC() for each N"""
+    print('%8s %12s %12s %8s %12s %12s %8s' %
+          ('N', 'limit loop', 'limit array', 'speedup',
+           'BC loop', 'BC array', 'speedup'))
+    for N in sizes:
+        np.random.seed(1)
+        b = boids.Boids(N)
+        vel = np.random.uniform(-4, 4, (N, 2))
+        # some boids outside each edge
+        pos = np.random.uniform(-20, max(boids.width, boids.height) + 20,
+                                (N, 2))
+        # fresh copies each run, both sides pay for the copy
+        tLoop = timeIt(lambda: limitLoop(vel.copy(), b.maxVel), repeat)
+        tArray = timeIt(lambda: b.limit(vel.copy(), b.maxVel), repeat)
+        bLoop = timeIt(lambda: applyBCLoop(pos.copy(), boids.width,
+                                           boids.height), repeat)
+        def bcArray():
+            b.pos = pos.copy()
+            b.applyBC()
+        bArray = timeIt(bcArray, repeat)
+        print('%8d %10.3f ms %10.3f ms %7.0fx %10.3f ms %10.3f ms %7.0fx' %
+              (N, 1000*tLoop, 1000*tArray, tLoop/tArray,
+               1000*bLoop, 1000*bArray, bLoop/bArray))
+
+# main() function
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks Boids limit/BC...")
+  parser.add_argument('--sizes', dest='sizes', nargs='+', required=False)
+  parser.add_argument('--repeat', dest='repeat', required=False)
+  args = parser.parse_args()
+  sizes = [100, 1000, 10000, 100000]
+  if args.sizes:
+      sizes = [int(n) for n in args.sizes]
+  repeat = 5
+  if args.repeat:
+      repeat = int(args.repeat)
+  benchmark(sizes, repeat)
+
+# call main
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,181 @@
+"""
+test_boids.py
+
+Checks the cell grid neighbor sums against the dense distance matrix.
+
+Author: Mahesh Venkitachalam
+"""
+
+import numpy as np
+import pytest
+
+import boids
+import domains
+import limitbench
+import trajectory
+from flockstore import FlockStore
+from cellgrid import neighborSums
+
+def checkRules(b):
+    """dense and grid rule velocities agree"""
+    b.distMatrix = boids.squareform(boids.pdist(b.pos))
+    assert np.allclose(b.applyRules(), b.applyRulesGrid(), atol=1e-12)
+
+def test_rules():
+    np.random.seed(1)
+    # the tight starting cluster
+    checkRules(boids.Boids(200))
+    # boids spread over the world
+    b = boids.Boids(1000)
+    b.pos = np.random.rand(1000, 2)*[boids.width, boids.height]
+    b.vel = np.random.uniform(-2, 2, (1000, 2))
+    checkRules(b)
+    # 'auto' uses the distance matrix for small flocks only
+    small, big = boids.Boids(100), boids.Boids(2001)
+    small.ruleVelocity(), big.ruleVelocity()
+    assert hasattr(small, 'distMatrix') and not hasattr(big, 'distMatrix')
+
+def test_chunks():
+    np.random.seed(2)
+    pos = np.random.rand(3000, 2)*[640, 480]
+    counts, sums = neighborSums(pos, [25.0, 50.0], [pos])
+    # tiny budget - many chunks, same sums
+    counts2, sums2 = neighborSums(pos, [25.0, 50.0], [pos], budget=500)
+    assert np.array_equal(counts, counts2)
+    assert np.allclose(sums[0][0], sums2[0][0])
+    assert np.allclose(sums[1][0], sums2[1][0])
+
+def test_limit_bc():
+    np.random.seed(3)
+    b = boids.Boids(1000)
+    X = np.random.uniform(-4, 4, (1000, 2))
+    ref = X.copy()
+    limitbench.limitLoop(ref, b.maxVel)
+    b.limit(X, b.maxVel)
+    assert np.allclose(X, ref, rtol=1e-14)
+    b.pos = np.random.uniform(-20, 700, (1000, 2))
+    ref = b.pos.copy()
+    limitbench.applyBCLoop(ref, boids.width, boids.height)
+    b.applyBC()
+    assert np.array_equal(b.pos, ref)
+
+def test_trajectory(tmp_path):
+    np.random.seed(4)
+    b = boids.Boids(50)
+    fileName = str(tmp_path / 'boids.traj')
+    b.recorder = trajectory.TrajectoryWriter(fileName, 50, chunkFrames=16)
+    b.step(40)
+    b.recorder.close()
+    # append to the same file
+    b.recorder = trajectory.TrajectoryWriter(fileName, 50, chunkFrames=16)
+    b.step(5)
+    b.recorder.close()
+    frames, meta = trajectory.readTrajectory(fileName)
+    assert b.ticks == 45 and meta['frames'] == 45
+    assert frames.dtype == np.float32 and frames.shape == (45, 50, 4)
+    assert np.allclose(frames[-1, :, :2], b.pos, rtol=1e-6)
+    assert np.allclose(frames[-1, :, 2:], b.vel, rtol=1e-6)
+    # the flock can't change size under a recorder
+    b.recorder = trajectory.TrajectoryWriter(fileName, 50)
+    with pytest.raises(ValueError):
+        b.spawn([[10, 10]])
+    with pytest.raises(ValueError):
+        b.despawn([0])
+    b.recorder.close()
+    assert b.N == 50
+
+def test_domains():
+    np.random.seed(4)
+    N, width = 3000, 4*boids.width
+    b = boids.Boids(N, 'grid', width, boids.height)
+    domains.spreadFlock(b)
+    # boids in every domain, some crossing between them
+    d = domains.DomainBoids(N, 'grid', width, boids.height, boids.width,
+                            workers=2)
+    d.pos, d.vel = b.pos.copy(), b.vel.copy()
+    try:
+        d.step(5)
+        b.step(5)
+        assert d.domains == 4
+        assert d.domainSizes().sum() == N
+        assert np.allclose(d.pos, b.pos, atol=1e-8)
+        assert np.allclose(d.vel, b.vel, atol=1e-8)
+        # changes between steps are stepped from, not undone
+        for f in (d, b):
+            f.vel[:] = 0
+            f.pos[:10] = [5, 5]
+        d.step(2)
+        b.step(2)
+        assert np.allclose(d.pos, b.pos, atol=1e-8)
+        assert np.allclose(d.vel, b.vel, atol=1e-8)
+        # boids come and go between steps
+        newPos = np.random.rand(100, 2)*[width, boids.height]
+        newVel = np.random.uniform(-1, 1, (100, 2))
+        for f in (d, b):
+            f.spawn(newPos, newVel)
+        d.step(3)
+        b.step(3)
+        for f in (d, b):
+            f.despawn(np.arange(0, N + 100, 3))
+        d.step(2)
+        b.step(2)
+        assert d.N == b.N == N + 100 - len(range(0, N + 100, 3))
+        assert np.allclose(d.pos, b.pos, atol=1e-8)
+        assert np.allclose(d.vel, b.vel, atol=1e-8)
+    finally:
+        d.close()
+    # the default world is split, a strip per worker
+    assert domains.DomainBoids(10, workers=3).domains == 3
+    # strips that are not a whole number of domainWidth, but still wide
+    # enough - 3 strips of 60
+    b = boids.Boids(500, 'grid', 180, boids.height)
+    domains.spreadFlock(b)
+    d = domains.DomainBoids(500, 'grid', 180, boids.height, 70, workers=2)
+    d.pos, d.vel = b.pos.copy(), b.vel.copy()
+    try:
+        d.step(3)
+        b.step(3)
+        assert d.domains == 3
+        assert np.allclose(d.pos, b.pos, atol=1e-8)
+    finally:
+        d.close()
+    # 3 strips of 43 would miss ghosts two strips away
+    with pytest.raises(ValueError):
+        domains.DomainBoids(10, 'grid', 130, boids.height, 50)
+
+def test_flockstore():
+    np.random.seed(5)
+    store = FlockStore(4)
+    pos = np.random.rand(10, 2)
+    vel = np.random.rand(10, 2)
+    ids = store.spawn(pos, vel)
+    # doubled 4 -> 8 -> 16
+    assert store.capacity == 16 and store.n == 10
+    assert store.pos.dtype == np.float32
+    store.despawn([0, 3, 9, 8])
+    kept = [1, 2, 4, 5, 6, 7]
+    assert store.n == 6
+    assert sorted(store.activeIds()) == list(ids[kept])
+    # rows follow their ids
+    rows = store.indexOf(ids[kept])
+    assert np.allclose(store.pos[rows], pos[kept], rtol=1e-6)
+    assert np.allclose(store.vel[rows], vel[kept], rtol=1e-6)
+    # spawn/despawn cycles within capacity do not reallocate
+    buf = store.posBuf
+    for i in range(20):
+        store.spawn(np.random.rand(5, 2), np.random.rand(5, 2))
+        store.despawn(np.arange(store.n - 5, store.n))
+    assert store.posBuf is buf and store.n == 6
+    # boids keep flocking as they come and go
+    b = boids.Boids(100)
+    b.spawn(np.random.rand(50, 2)*[boids.width, boids.height])
+    b.step(2)
+    b.despawn(np.arange(0, 150, 3))
+    b.step(2)
+    assert b.N == 100 and b.pos.shape == (100, 2)
+    # positions alone can't grow the flock - new boids need velocities
+    with pytest.raises(ValueError):
+        b.pos = np.zeros((120, 2))
+    b.setFlock(np.ones((120, 2)), np.zeros((120, 2)))
+    b.step()
+    assert b.N == 120 and np.isfinite(b.pos).all()
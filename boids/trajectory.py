@@ -0,0 +1,105 @@
+"""
+trajectory.py
+
+Author: Mahesh Venkitachalam
+
+Records Boids trajectories to disk for offline analysis and playback.
+A trajectory file holds a JSON header padded to 4 KB, then one frame
+per recorded tick of N x 4 float32 values (x, y, vx, vy). The file is
+grown a chunk of frames at a time and each chunk is memory-mapped, so
+recording is a copy into the page cache; frames already written are
+never touched again.
+"""
+
+import os, json, struct
+import numpy as np
+
+MAGIC = b'BOIDTRAJ'
+HEADER = 4096
+
+class TrajectoryWriter:
+    """Appends frames of boid positions and velocities to a file"""
+    def __init__(self, fileName, N, chunkFrames=256):
+        self.fileName = fileName
+        self.N = N
+        self.chunkFrames = chunkFrames
+        self.frameBytes = N*4*4
+        if os.path.exists(fileName):
+            # continue an existing trajectory
+            meta = readHeader(fileName)
+            if meta['N'] != N:
+                raise ValueError('%s has %d boids, not %d' %
+                                 (fileName, meta['N'], N))
+            self.frames = meta['frames']
+            self.f = open(fileName, 'r+b')
+        else:
+            self.frames = 0
+            self.f = open(fileName, 'w+b')
+            self.writeHeader()
+        # frames mapped so far, and the current chunk
+        self.chunk = None
+        self.chunkStart = self.frames
+
+    def writeHeader(self):
+        header = json.dumps({'N': self.N, 'frames': self.frames,
+                             'fields': ['x', 'y', 'vx', 'vy'],
+                             'dtype': '<f4'}).encode()
+        self.f.seek(0)
+        self.f.write(MAGIC + struct.pack('<Q', len(header)))
+        self.f.write(header.ljust(HEADER - 16))
+
+    def mapChunk(self):
+        """grows the file by one chunk of frames and maps it"""
+        if self.chunk is not None:
+            self.chunk.flush()
+            # frames so far survive a crash
+            self.writeHeader()
+        self.chunkStart = self.frames
+        self.f.truncate(HEADER + (self.frames + self.chunkFrames)*
+                        self.frameBytes)
+        self.chunk = np.memmap(self.f, dtype='<f4', mode='r+',
+                               offset=HEADER + self.frames*self.frameBytes,
+                               shape=(self.chunkFrames, self.N, 4))
+
+    def append(self, pos, vel):
+        """records one frame"""
+        if len(pos) != self.N:
+            raise ValueError('trajectory has %d boids, got %d' %
+                             (self.N, len(pos)))
+        k = self.frames - self.chunkStart
+        if self.chunk is None or k == self.chunkFrames:
+            self.mapChunk()
+            k = 0
+        frame = self.chunk[k]
+        frame[:, :2] = pos
+        frame[:, 2:] = vel
+        self.frames += 1
+
+    def close(self):
+        """flushes frames, trims the unused part of the last chunk"""
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+        self.f.truncate(HEADER + self.frames*self.frameBytes)
+        self.writeHeader()
+        self.f.close()
+
+def readHeader(fileName):
+    """returns the meta data of a trajectory file"""
+    with open(fileName, 'rb') as f:
+        magic, size = f.read(8), struct.unpack('<Q', f.read(8))[0]
+        if magic != MAGIC:
+            raise ValueError('%s is not a trajectory file' % fileName)
+        return json.loads(f.read(size).decode())
+
+def readTrajectory(fileName):
+    """
+    Returns (frames, meta), where frames is a read-only memory map of
+    shape (frames, N, 4) holding x, y, vx, vy
+    """
+    meta = readHeader(fileName)
+    if meta['frames'] == 0:
+        return np.zeros((0, meta['N'], 4), np.float32), meta
+    frames = np.memmap(fileName, dtype='<f4', mode='r', offset=HEADER,
+                       shape=(meta['frames'], meta['N'], 4))
+    return frames, meta
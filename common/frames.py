@@ -0,0 +1,79 @@
+"""
+frames.py
+
+Author: Mahesh Venkitachalam
+
+Reads image sequences as grayscale numpy arrays, one frame at a time:
+either the images of a directory in name order, or the frames of a
+video file decoded by an ffmpeg pipe. A source that can't be read
+raises when it is opened, not halfway through a run.
+"""
+
+import os, shutil, subprocess
+import numpy as np
+from PIL import Image
+
+def dirFrames(frameDir):
+    """Yields the images in a directory, in name order, as grayscale arrays"""
+    for fileName in sorted(os.listdir(frameDir)):
+        fileName = os.path.join(frameDir, fileName)
+        try:
+            image = Image.open(fileName).convert('L')
+        except OSError:
+            continue
+        yield np.asarray(image)
+
+def pipeFrames(proc, fileName, W, H):
+    """yields W x H gray frames from an ffmpeg process, then checks it"""
+    finished = False
+    try:
+        while True:
+            data = proc.stdout.read(W*H)
+            if len(data) < W*H:
+                break
+            yield np.frombuffer(data, np.uint8).reshape(H, W)
+        finished = True
+    finally:
+        proc.stdout.close()
+        if not finished:
+            # the caller stopped early
+            proc.kill()
+        err = proc.stderr.read().decode(errors='replace').strip()
+        proc.stderr.close()
+        proc.wait()
+    if proc.returncode:
+        raise ValueError('ffmpeg failed decoding %s: %s' % (fileName, err))
+
+def videoFrames(fileName):
+    """
+    Returns a generator of the frames of a video file as grayscale
+    arrays. Raises FileNotFoundError without ffmpeg, and ValueError if
+    the file has no readable video stream.
+    """
+    for tool in ['ffprobe', 'ffmpeg']:
+        if shutil.which(tool) is None:
+            raise FileNotFoundError('%s is needed to read %s' %
+                                    (tool, fileName))
+    probe = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=width,height', '-of', 'csv=p=0', fileName],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    size = probe.stdout.decode().strip().split(',')[:2]
+    if probe.returncode or len(size) < 2:
+        raise ValueError('no video stream in %s: %s' %
+                         (fileName, probe.stderr.decode(errors='replace')
+                          .strip()))
+    W, H = [int(v) for v in size]
+    cmd = ['ffmpeg', '-loglevel', 'error', '-i', fileName,
+           '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    return pipeFrames(proc, fileName, W, H)
+
+def readFrames(path):
+    """frames of a directory of images, or of a video file"""
+    if os.path.isdir(path):
+        return dirFrames(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError('%s does not exist' % path)
+    return videoFrames(path)
@@ -0,0 +1,177 @@
+"""
+tilestats.py
+
+Author: Mahesh Venkitachalam
+
+Tile statistics from summed-area tables (integral images). After one
+pass over an image, the sum, mean and variance of any rectangle take
+four table lookups, so an image can be re-tiled at any grid size
+without touching its pixels again. Tables of image files are cached on
+disk, keyed by a hash of the file contents, as uint32 where the sums
+fit - half the size of int64. The least recently used tables are
+dropped once the cache outgrows CACHE_MAX bytes.
+"""
+
+import os, hashlib
+import numpy as np
+from PIL import Image
+
+# tables of image files are cached here
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tilestats')
+# total size of the cache, beyond which old tables are removed
+CACHE_MAX = 256 << 20
+
+def integralImage(im):
+    """
+    Given an (H, W) or (H, W, channels) array, returns its summed-area
+    table of shape (H+1, W+1, ...), where S[y, x] is the sum of im[:y, :x]
+    """
+    H, W = im.shape[:2]
+    S = np.zeros((H + 1, W + 1) + im.shape[2:], np.int64)
+    np.cumsum(im, axis=0, dtype=np.int64, out=S[1:, 1:])
+    np.cumsum(S[1:, 1:], axis=1, out=S[1:, 1:])
+    return S
+
+def narrowTable(S):
+    """returns table S as uint32 if its sums fit, else as it is"""
+    if S.size and S.max() < 1 << 32:
+        return S.astype(np.uint32)
+    return S
+
+def pruneCache(cacheDir, maxBytes=CACHE_MAX):
+    """removes the least recently used tables until cacheDir fits maxBytes"""
+    entries = []
+    for name in os.listdir(cacheDir):
+        path = os.path.join(cacheDir, name)
+        if name.endswith('.npz') and os.path.isfile(path):
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+    total = sum(e[1] for e in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # another process got there first
+            pass
+        total -= size
+
+def fileHash(fileName):
+    """returns the SHA-1 hex digest of a file's contents"""
+    h = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class TileStats:
+    """Summed-area tables of an image and its squares"""
+    def __init__(self, im=None, sums=None, squares=None):
+        # either an image array, or tables from a cache
+        self.im = im
+        self.sums = sums if sums is not None else integralImage(im)
+        # table of squares is only built if variances are asked for
+        self.squares = squares
+        self.H = self.sums.shape[0] - 1
+        self.W = self.sums.shape[1] - 1
+        # image file and cache file, set by loadTileStats
+        self.fileName = self.mode = self.cacheFile = None
+
+    def getImage(self):
+        """returns the image array, reading the image file if needed"""
+        if self.im is None:
+            self.im = np.asarray(Image.open(self.fileName).convert(self.mode))
+        return self.im
+
+    def getSquares(self):
+        """returns the table of squares, building it on first use"""
+        if self.squares is None:
+            im = self.getImage().astype(np.int64)
+            self.squares = integralImage(im*im)
+            if self.cacheFile:
+                self.save(self.cacheFile)
+                pruneCache(os.path.dirname(self.cacheFile))
+        return self.squares
+
+    def rectSums(self, table, x1, y1, x2, y2):
+        """sums of table over [x1, x2) x [y1, y2) - arguments may be arrays"""
+        return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+    def mean(self, x1, y1, x2, y2):
+        """mean of [x1, x2) x [y1, y2) - arguments may be arrays"""
+        n = np.asarray((x2 - x1)*(y2 - y1))
+        if self.sums.ndim == 3:
+            n = n[..., None]
+        return self.rectSums(self.sums, x1, y1, x2, y2)/n
+
+    def variance(self, x1, y1, x2, y2):
+        """variance of [x1, x2) x [y1, y2) - arguments may be arrays"""
+        n = np.asarray((x2 - x1)*(y2 - y1))
+        if self.sums.ndim == 3:
+            n = n[..., None]
+        s = self.rectSums(self.sums, x1, y1, x2, y2)
+        sq = self.rectSums(self.getSquares(), x1, y1, x2, y2)
+        # integer numerator, so no cancellation error
+        return (n*sq - s*s)/(n*n)
+
+    def gridSums(self, xs, ys):
+        """
+        Given tile edges xs (cols+1) and ys (rows+1), returns the sums of
+        all rows x cols tiles
+        """
+        S = self.sums[np.asarray(ys)][:, np.asarray(xs)]
+        return S[1:, 1:] - S[:-1, 1:] - S[1:, :-1] + S[:-1, :-1]
+
+    def gridCounts(self, xs, ys):
+        """returns the number of pixels in each tile of the grid"""
+        return np.outer(np.diff(ys), np.diff(xs))
+
+    def gridMeans(self, xs, ys):
+        """returns the means of all tiles of the grid"""
+        counts = self.gridCounts(xs, ys)
+        if self.sums.ndim == 3:
+            counts = counts[..., None]
+        return self.gridSums(xs, ys)/counts
+
+    def save(self, cacheFile):
+        """writes the tables to cacheFile"""
+        cacheDir = os.path.dirname(cacheFile)
+        if cacheDir and not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+        tables = {'sums': narrowTable(self.sums)}
+        if self.squares is not None:
+            tables['squares'] = narrowTable(self.squares)
+        # write to a temporary file first so readers never see half a file
+        tmpFile = cacheFile + '.tmp.npz'
+        np.savez(tmpFile, **tables)
+        os.replace(tmpFile, cacheFile)
+
+def loadTileStats(fileName, mode, cacheDir=CACHE_DIR):
+    """
+    Returns TileStats of an image file converted to given PIL mode
+    ('L' or 'RGB'). Tables built before are read from cacheDir without
+    decoding the image; pass cacheDir=None to skip the cache.
+    """
+    stats = None
+    cacheFile = None
+    if cacheDir:
+        cacheFile = os.path.join(cacheDir,
+                                 '%s-%s.npz' % (fileHash(fileName), mode))
+        if os.path.exists(cacheFile):
+            # tables are stored narrow - widen them for the arithmetic
+            with np.load(cacheFile) as data:
+                squares = None
+                if 'squares' in data:
+                    squares = data['squares'].astype(np.int64)
+                stats = TileStats(sums=data['sums'].astype(np.int64),
+                                  squares=squares)
+            # mark as recently used
+            os.utime(cacheFile)
+    if stats is None:
+        stats = TileStats(np.asarray(Image.open(fileName).convert(mode)))
+        if cacheFile:
+            stats.save(cacheFile)
+            pruneCache(cacheDir)
+    stats.fileName, stats.mode, stats.cacheFile = fileName, mode, cacheFile
+    return stats
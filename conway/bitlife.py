@@ -0,0 +1,205 @@
+"""
+bitlife.py
+
+Author: Mahesh Venkitachalam
+
+A bit-packed Game of Life grid. Each row is stored as uint64 words
+holding 64 cells each, and a generation is computed for 64 cells at
+a time with bitwise adder trees.
+"""
+
+import numpy as np
+
+from rules import CONWAY, parseRule
+
+# number of rows stepped together - bounds the size of temporaries
+BAND_ROWS = 256
+
+def packCells(cells):
+    """packs a (rows, N) grid of on/off values into (rows, words) uint64"""
+    cells = np.asarray(cells) != 0
+    rows, N = cells.shape
+    nWords = (N + 63)//64
+    # pad each row to a whole number of words
+    padded = np.zeros((rows, nWords*64), np.bool_)
+    padded[:, :N] = cells
+    # cell x of a row is bit x%64 of word x//64
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+def unpackWords(words, N):
+    """unpacks (rows, words) uint64 into a (rows, N) 0/1 uint8 grid"""
+    bytes8 = np.ascontiguousarray(words, '<u8').view(np.uint8)
+    return np.unpackbits(bytes8, axis=1, count=N, bitorder='little')
+
+def shiftWest(A, N):
+    """returns words where cell x holds cell x-1 of A, wrapping around"""
+    r = N % 64
+    out = A << np.uint64(1)
+    out[:, 1:] |= A[:, :-1] >> np.uint64(63)
+    # cell 0 gets the last cell of the row
+    if r == 0:
+        out[:, 0] |= A[:, -1] >> np.uint64(63)
+    else:
+        out[:, 0] |= (A[:, -1] >> np.uint64(r - 1)) & np.uint64(1)
+    return out
+
+def shiftEast(A, N):
+    """returns words where cell x holds cell x+1 of A, wrapping around"""
+    r = N % 64
+    out = A >> np.uint64(1)
+    out[:, :-1] |= A[:, 1:] << np.uint64(63)
+    # the last cell of the row gets cell 0
+    if r == 0:
+        out[:, -1] |= A[:, 0] << np.uint64(63)
+    else:
+        out[:, -1] |= (A[:, 0] & np.uint64(1)) << np.uint64(r - 1)
+    return out
+
+def lastWordMask(N):
+    """mask of the cells actually used in the last word of a row"""
+    r = N % 64
+    if r == 0:
+        return np.uint64(0xFFFFFFFFFFFFFFFF)
+    return np.uint64((1 << r) - 1)
+
+def sumEquals(bits, value):
+    """returns words with bits set where the 4-bit sum in bits == value"""
+    out = None
+    for i, bit in enumerate(bits):
+        term = bit if (value >> i) & 1 else ~bit
+        out = term if out is None else out & term
+    return out
+
+def stepBand(B, N, counts=None):
+    """
+    Given a band of rows with one halo row above and below, returns the
+    next generation of the inner rows. counts is the (birth, survive)
+    neighbor counts of the rule, None for Conway's rules.
+    """
+    L = shiftWest(B, N)
+    R = shiftEast(B, N)
+    # horizontal 3-cell sums of each row as 2-bit numbers (h1 h0)
+    x = L ^ R
+    h0 = x ^ B
+    h1 = (L & R) | (x & B)
+    del L, R, x
+    # add the sums of the rows above (a), the row itself (b) and below (c)
+    a0, b0, c0 = h0[:-2], h0[1:-1], h0[2:]
+    a1, b1, c1 = h1[:-2], h1[1:-1], h1[2:]
+    # bit 0 of the 3x3 block sum, carried into bit 1
+    ab0 = a0 ^ b0
+    t0 = ab0 ^ c0
+    carry = (a0 & b0) | (c0 & ab0)
+    # bit 1 - four inputs of weight 2
+    ab1 = a1 ^ b1
+    u = ab1 ^ c1
+    t1 = u ^ carry
+    # bits 2 and 3 from the carries of weight 4
+    k = (a1 & b1) | (c1 & ab1)
+    k2 = u & carry
+    t2 = k ^ k2
+    C = B[1:-1]
+    if counts is None:
+        # the block sum includes the cell itself: a cell is ON next if
+        # the sum is 3, or if the sum is 4 and the cell is already ON -
+        # sums of 8 or more never match, so the weight-8 bit is not needed
+        return (~t2 & t1 & t0) | (C & t2 & ~(t1 | t0))
+    # general rule - match the block sum against each neighbor count,
+    # counting the cell itself for survival
+    bits = [t0, t1, t2, k & k2]
+    birth, survive = counts
+    born = np.zeros_like(C)
+    for n in birth:
+        born |= sumEquals(bits, n)
+    stay = np.zeros_like(C)
+    for n in survive:
+        stay |= sumEquals(bits, n + 1)
+    return (~C & born) | (C & stay)
+
+def stepRows(A, out, N, start, stop, counts=None):
+    """computes the next generation of rows start..stop-1 of A into out"""
+    rows = A.shape[0]
+    for r0 in range(start, stop, BAND_ROWS):
+        r1 = min(stop, r0 + BAND_ROWS)
+        # band plus one halo row on each side, with toroidal wrap
+        B = A[np.arange(r0 - 1, r1 + 1) % rows]
+        out[r0:r1] = stepBand(B, N, counts)
+    # keep the padding bits of the last word clear
+    out[start:stop, -1] &= lastWordMask(N)
+
+def stepBits(A, out, N, counts=None):
+    """computes the next generation of packed grid A into out"""
+    stepRows(A, out, N, 0, A.shape[0], counts)
+
+class BitEngine:
+    """Engine that steps a bit-packed grid, 64 cells per word"""
+    def __init__(self, grid, rule=CONWAY):
+        self.words = packCells(grid)
+        self.N = np.asarray(grid).shape[1]
+        self.rule = rule
+        # Conway's rules have a faster adder tree
+        self.counts = parseRule(rule)
+        if self.counts == parseRule(CONWAY):
+            self.counts = None
+        self.out = np.empty_like(self.words)
+        self.generation = 0
+
+    @classmethod
+    def fromWords(cls, words, N, **kwargs):
+        """returns an engine stepping the given packed grid of N columns"""
+        engine = cls(np.zeros((0, N), np.uint8), **kwargs)
+        engine.words = words
+        engine.out = np.empty(words.shape, '<u8')
+        return engine
+
+    @classmethod
+    def zeros(cls, N, **kwargs):
+        """returns an engine with an empty NxN grid"""
+        return cls.fromWords(np.zeros((N, (N + 63)//64), '<u8'), N, **kwargs)
+
+    @classmethod
+    def random(cls, N, p=0.2, **kwargs):
+        """returns an engine with an NxN grid, each cell ON with prob. p"""
+        engine = cls.zeros(N, **kwargs)
+        # generate and pack a band at a time to bound memory use
+        for r0 in range(0, N, BAND_ROWS):
+            r1 = min(N, r0 + BAND_ROWS)
+            engine.words[r0:r1] = packCells(np.random.rand(r1 - r0, N) < p)
+        return engine
+
+    def paste(self, i, j, pattern):
+        """sets the cells of pattern with top left cell at (i, j)"""
+        h, w = np.asarray(pattern).shape
+        rows = np.arange(i, i + h) % self.words.shape[0]
+        cols = np.arange(j, j + w) % self.N
+        cells = unpackWords(self.words[rows], self.N)
+        cells[:, cols] = np.asarray(pattern) != 0
+        self.words[rows] = packCells(cells)
+
+    def step(self):
+        """advance the simulation by one generation"""
+        stepBits(self.words, self.out, self.N, self.counts)
+        self.words, self.out = self.out, self.words
+        self.generation += 1
+
+    def fingerprint(self):
+        """
+        returns a 64-bit multilinear hash of the packed grid: the sum of
+        its 32-bit half words times random 64-bit keys, mod 2**64. Two
+        different grids collide with probability at most 2**-32, and it
+        is one numpy dot product instead of a pass of blake2b.
+        """
+        halves = np.ascontiguousarray(self.words).view('<u4').reshape(-1)
+        if getattr(self, 'hashKeys', None) is None or \
+                len(self.hashKeys) != len(halves):
+            # fixed keys, without touching the global RNG
+            rng = np.random.default_rng(0x6c696665)
+            self.hashKeys = rng.integers(0, 1 << 64, len(halves), np.uint64,
+                                         endpoint=False)
+            self.hashHalves = np.empty(len(halves), np.uint64)
+        np.copyto(self.hashHalves, halves, casting='unsafe')
+        return int(np.dot(self.hashHalves, self.hashKeys))
+
+    def getCells(self):
+        """returns the current generation as a 0/1 grid"""
+        return unpackWords(self.words, self.N)
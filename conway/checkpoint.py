@@ -0,0 +1,143 @@
+"""
+checkpoint.py
+
+Author: Mahesh Venkitachalam
+
+Checkpoints of a Game of Life run. A checkpoint file holds a JSON
+header (grid size, generation, rule, engine and numpy RNG state),
+padded to a 4 KB boundary, followed by the grid packed 64 cells per
+uint64 word. Bit packing shrinks the grid 8x against a byte per cell
+while keeping it memory-mappable, so even huge boards resume without
+reading the whole grid into memory.
+
+Checkpoints are written by a background thread, so the simulation
+only pays for taking a snapshot of the grid.
+"""
+
+import os, json, struct, threading, queue
+import numpy as np
+
+from bitlife import packCells, unpackWords
+
+MAGIC = b'LIFECKPT'
+
+def writeCheckpoint(fileName, words, meta):
+    """writes packed grid words and meta data, replacing fileName atomically"""
+    header = json.dumps(meta).encode()
+    # grid data starts on a 4 KB boundary
+    offset = (16 + len(header) + 4095)//4096*4096
+    tmpFile = fileName + '.tmp'
+    with open(tmpFile, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', offset))
+        f.write(header.ljust(offset - 16))
+        np.ascontiguousarray(words, '<u8').tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFile, fileName)
+
+def readCheckpoint(fileName):
+    """
+    Returns (words, meta) of a checkpoint. words is memory-mapped
+    copy-on-write, so stepping never modifies the file.
+    """
+    with open(fileName, 'rb') as f:
+        magic, offset = f.read(8), struct.unpack('<Q', f.read(8))[0]
+        if magic != MAGIC:
+            raise ValueError('%s is not a checkpoint file' % fileName)
+        meta = json.loads(f.read(offset - 16).decode())
+    words = np.memmap(fileName, dtype='<u8', mode='c', offset=offset,
+                      shape=(meta['rows'], meta['words']))
+    return words, meta
+
+def getRNGState():
+    """returns the numpy global RNG state as JSON friendly lists"""
+    name, keys, pos, hasGauss, cached = np.random.get_state()
+    return [name, keys.tolist(), pos, hasGauss, cached]
+
+def setRNGState(state):
+    """restores the numpy global RNG state from getRNGState()"""
+    name, keys, pos, hasGauss, cached = state
+    np.random.set_state((name, np.array(keys, np.uint32), pos, hasGauss,
+                         cached))
+
+def snapshot(engine, engineName):
+    """returns (words, meta) for the current state of engine"""
+    if hasattr(engine, 'words'):
+        # bit-packed engines overwrite their grid two steps from now
+        words = np.array(engine.words)
+    else:
+        words = packCells(engine.getCells())
+    meta = {'N': engine.N, 'rows': words.shape[0], 'words': words.shape[1],
+            'generation': engine.generation, 'rule': engine.rule,
+            'engine': engineName, 'rng': getRNGState()}
+    return words, meta
+
+def restoreEngine(engineClass, words, meta, **kwargs):
+    """creates an engine of given class from a checkpoint"""
+    if hasattr(engineClass, 'fromWords'):
+        # packed engines step straight from the memory-mapped grid
+        engine = engineClass.fromWords(words, meta['N'], **kwargs)
+    else:
+        # other engines take 0/255 grids
+        grid = unpackWords(words, meta['N'])*np.uint8(255)
+        engine = engineClass(grid, **kwargs)
+    engine.generation = meta['generation']
+    setRNGState(meta['rng'])
+    return engine
+
+class Checkpointer:
+    """Writes a checkpoint every given number of generations"""
+    def __init__(self, fileName, every, engineName):
+        # fail now rather than in the writer thread
+        dirName = os.path.dirname(os.path.abspath(fileName))
+        if not os.path.isdir(dirName):
+            raise ValueError('checkpoint directory %s does not exist' %
+                             dirName)
+        self.fileName = fileName
+        self.every = every
+        self.engineName = engineName
+        self.count = 0
+        # first error of the writer thread, raised by save() and close()
+        self.error = None
+        # at most one snapshot waits to be written, bounding memory use
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.writer)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def writer(self):
+        """background thread - writes queued snapshots"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            # after an error keep taking snapshots, so save() never blocks
+            if self.error is None:
+                try:
+                    writeCheckpoint(self.fileName, *item)
+                except Exception as e:
+                    self.error = e
+
+    def checkError(self):
+        """raises the writer thread's error, if any"""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def update(self, engine):
+        """call after each step - saves when a checkpoint is due"""
+        if engine.generation % self.every == 0:
+            self.save(engine)
+
+    def save(self, engine):
+        """hands a snapshot of engine to the writer thread"""
+        self.checkError()
+        self.queue.put(snapshot(engine, self.engineName))
+        self.count += 1
+
+    def close(self):
+        """waits for pending checkpoints to be written"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.checkError()
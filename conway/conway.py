@@ -10,6 +10,15 @@ import sys, argparse
 import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.animation as animation
+from bitlife import BitEngine
+from hashlife import HashLifeEngine
+from sparselife import SparseEngine
+from parallel import ParallelEngine
+from rules import CONWAY, parseRule, ruleTable, ruleRanges, applyRule
+from patterns import loadPattern
+from headless import runHeadless, PipeWriter, FileWriter
+from cycles import CycleDetector, fingerprint, skipCycles
+from checkpoint import Checkpointer, readCheckpoint, restoreEngine
 
 ON = 255
 OFF = 0
@@ -17,7 +26,8 @@ vals = [ON, OFF]
 
 def randomGrid(N):
     """returns a grid of NxN random values"""
-    return np.random.choice(vals, N*N, p=[0.2, 0.8]).reshape(N, N)
+    return np.random.choice(np.array(vals, np.uint8), N*N, 
+                            p=[0.2, 0.8]).reshape(N, N)
 
 def addGlider(i, j, grid):
     """adds a glider with top left cell at (i, j)"""
@@ -54,7 +64,8 @@ def addGosperGliderGun(i, j, grid):
 
     grid[i:i+11, j:j+38] = gun
 
-def update(frameNum, img, grid, N):
+def stepLoop(grid, N, birth=(3,), survive=(2, 3)):
+    """reference engine - returns next generation of 0/255 grid, cell by cell"""
     # copy grid since we require 8 neighbors for calculation
     # and we go line by line 
     newGrid = grid.copy()
@@ -67,16 +78,162 @@ def update(frameNum, img, grid, N):
                          grid[(i-1)%N, j] + grid[(i+1)%N, j] + 
                          grid[(i-1)%N, (j-1)%N] + grid[(i-1)%N, (j+1)%N] + 
                          grid[(i+1)%N, (j-1)%N] + grid[(i+1)%N, (j+1)%N])/255)
-            # apply Conway's rules
+            # apply birth/survival rules - Conway's are B3/S23
             if grid[i, j]  == ON:
-                if (total < 2) or (total > 3):
+                if total not in survive:
                     newGrid[i, j] = OFF
             else:
-                if total == 3:
+                if total in birth:
                     newGrid[i, j] = ON
+    return newGrid
+
+def stepNumpy(cells, ranges=ruleRanges(ruleTable(CONWAY))):
+    """returns next generation of a 0/1 uint8 grid, whole grid at once"""
+    # 3x3 block sums with toroidal wrap - rows first, then columns
+    vert = cells + np.roll(cells, 1, axis=0) + np.roll(cells, -1, axis=0)
+    total = vert + np.roll(vert, 1, axis=1) + np.roll(vert, -1, axis=1)
+    # apply the rule for each cell state and block sum
+    total += cells*np.uint8(10)
+    return applyRule(total, ranges)
+
+def gridToCells(grid):
+    """converts a 0/255 grid into a compact 0/1 uint8 grid"""
+    return (np.asarray(grid) == ON).astype(np.uint8)
+
+def cellsToGrid(cells):
+    """converts a 0/1 grid back into a 0/255 grid"""
+    return cells.astype(np.uint8)*ON
+
+class LoopEngine:
+    """Reference engine that steps the 0/255 grid cell by cell"""
+    def __init__(self, grid, rule=CONWAY):
+        # wide ints so the neighbor sums of 0/255 values do not overflow
+        self.grid = np.array(grid, dtype=int)
+        self.N = self.grid.shape[0]
+        self.rule = rule
+        self.birth, self.survive = parseRule(rule)
+        self.generation = 0
+
+    def step(self):
+        """advance the simulation by one generation"""
+        self.grid = stepLoop(self.grid, self.N, self.birth, self.survive)
+        self.generation += 1
+
+    def getCells(self):
+        """returns the current generation as a 0/1 grid"""
+        return gridToCells(self.grid)
+
+class NumpyEngine:
+    """Vectorized engine that steps a 0/1 uint8 grid"""
+    def __init__(self, grid, rule=CONWAY):
+        self.cells = gridToCells(grid)
+        self.N = self.cells.shape[0]
+        self.rule = rule
+        self.ranges = ruleRanges(ruleTable(rule))
+        self.generation = 0
+
+    def step(self):
+        """advance the simulation by one generation"""
+        self.cells = stepNumpy(self.cells, self.ranges)
+        self.generation += 1
+
+    def getCells(self):
+        """returns the current generation as a 0/1 grid"""
+        return self.cells
+
+# available step engines, selected with --engine
+engines = {'loop': LoopEngine, 'numpy': NumpyEngine, 'bits': BitEngine,
+           'hashlife': HashLifeEngine, 'sparse': SparseEngine,
+           'parallel': ParallelEngine}
+
+def addPattern(i, j, pattern, grid):
+    """adds a 0/1 pattern with top left cell at (i, j), wrapping around"""
+    h, w = pattern.shape
+    rows = np.arange(i, i + h) % grid.shape[0]
+    cols = np.arange(j, j + w) % grid.shape[1]
+    grid[np.ix_(rows, cols)] = (pattern != 0)*ON
+
+def demoSeeds(glider, gosper):
+    """returns the (i, j, pattern) seeds of the demo flags"""
+    if glider:
+        pattern = np.zeros((3, 3), np.uint8)
+        addGlider(0, 0, pattern)
+        return [(1, 1, pattern)]
+    if gosper:
+        pattern = np.zeros((11, 38), np.uint8)
+        addGosperGliderGun(0, 0, pattern)
+        return [(10, 10, pattern)]
+    return None
+
+def createEngine(engineName, N, seeds=None, rule=CONWAY, workers=None):
+    """
+    Creates the named engine with an NxN grid holding the given list of
+    (i, j, pattern) seeds, or a random grid if seeds is None.
+    """
+    if engineName in ['bits', 'parallel']:
+        engineClass = engines[engineName]
+        kwargs = {'rule': rule}
+        if engineName == 'parallel':
+            kwargs['workers'] = workers
+        # build the packed grid directly so huge boards fit in memory
+        if seeds is None:
+            return engineClass.random(N, **kwargs)
+        engine = engineClass.zeros(N, **kwargs)
+        for i, j, pattern in seeds:
+            engine.paste(i, j, pattern)
+        return engine
+    if seeds is None:
+        # populate grid with random on/off - more off than on
+        grid = randomGrid(N)
+    else:
+        grid = np.zeros((N, N), np.uint8)
+        for i, j, pattern in seeds:
+            addPattern(i, j, pattern, grid)
+    return engines[engineName](grid, rule)
+
+def printStats(engine):
+    """prints engine statistics, for engines that keep them"""
+    if hasattr(engine, 'stats'):
+        stats = engine.stats()
+        print(', '.join(['%s: %.1f' % (key, val) if isinstance(val, float)
+                         else '%s: %s' % (key, val) 
+                         for key, val in sorted(stats.items())]))
+
+def jumpAhead(engine, generations, fastForward=False):
+    """
+    Advance engine by the given number of generations. With fastForward,
+    whole periods are skipped once the grid is found to repeat.
+    """
+    if hasattr(engine, 'advance'):
+        # hashlife skips ahead in powers of 2
+        engine.advance(generations)
+    else:
+        detector = CycleDetector()
+        if fastForward:
+            detector.add(engine.generation, fingerprint(engine))
+        while generations > 0:
+            engine.step()
+            generations -= 1
+            if fastForward and \
+                    detector.add(engine.generation, fingerprint(engine)):
+                generations = skipCycles(engine, detector, generations)
+                fastForward = False
+                print(detector.describe())
+    print('generation: %d' % engine.generation)
+    printStats(engine)
+
+def closeEngine(engine):
+    """releases worker processes, for engines that use them"""
+    if hasattr(engine, 'close'):
+        engine.close()
+
+def update(frameNum, img, engine, checkpointer=None):
+    # compute next generation
+    engine.step()
+    if checkpointer:
+        checkpointer.update(engine)
     # update data
-    img.set_data(newGrid)
-    grid[:] = newGrid[:]
+    img.set_data(engine.getCells())
     return img,
 
 # main() function
@@ -91,6 +248,28 @@ def main():
     parser.add_argument('--interval', dest='interval', required=False)
     parser.add_argument('--glider', action='store_true', required=False)
     parser.add_argument('--gosper', action='store_true', required=False)
+    parser.add_argument('--engine', dest='engine', required=False,
+                        choices=sorted(engines.keys()))
+    parser.add_argument('--generations', dest='generations', required=False)
+    parser.add_argument('--headless', action='store_true', required=False)
+    parser.add_argument('--frames', dest='frames', required=False)
+    parser.add_argument('--frame-dir', dest='frameDir', required=False)
+    parser.add_argument('--frame-format', dest='frameFormat', required=False,
+                        choices=['png', 'npy'])
+    parser.add_argument('--workers', dest='workers', required=False)
+    parser.add_argument('--rule', dest='rule', required=False)
+    parser.add_argument('--pattern', dest='patterns', action='append',
+                        required=False)
+    parser.add_argument('--offset', dest='offsets', nargs=2, action='append',
+                        required=False)
+    parser.add_argument('--on-cycle', dest='onCycle', required=False,
+                        choices=['report', 'stop', 'fastforward'])
+    parser.add_argument('--checkpoint', dest='checkpoint', required=False)
+    parser.add_argument('--checkpoint-every', dest='checkpointEvery',
+                        required=False)
+    parser.add_argument('--resume', dest='resume', required=False)
+    parser.add_argument('--display', dest='display', required=False,
+                        choices=['mpl', 'gl'])
     args = parser.parse_args()
     
     # set grid size
@@ -103,23 +282,125 @@ def main():
     if args.interval:
         updateInterval = int(args.interval)
 
-    # declare grid
-    grid = np.array([])
-    # check if "glider" demo flag is specified
-    if args.glider:
-        grid = np.zeros(N*N).reshape(N, N)
-        addGlider(1, 1, grid)
-    elif args.gosper:
-        grid = np.zeros(N*N).reshape(N, N)
-        addGosperGliderGun(10, 10, grid)
+    # resume from a checkpoint - its grid size, engine and rule are used
+    # unless given on the command line
+    if args.resume:
+        words, meta = readCheckpoint(args.resume)
+        N = meta['N']
+
+    # create step engine and seed grid - vectorized by default
+    engineName = 'numpy'
+    if args.resume:
+        engineName = meta['engine']
+    if args.engine:
+        engineName = args.engine
+    if engineName == 'hashlife' and N & (N - 1):
+        print('hashlife needs a power of 2 grid size, got %d' % N)
+        exit(0)
+    # worker processes for the parallel engine - all cores by default
+    workers = None
+    if args.workers:
+        workers = int(args.workers)
+    # seed with the demo patterns, or with pattern files
+    seeds = demoSeeds(args.glider, args.gosper)
+    fileRule = None
+    if args.patterns:
+        seeds = []
+        offsets = args.offsets or []
+        for index, fileName in enumerate(args.patterns):
+            cells, fileRule = loadPattern(fileName)
+            # place at the given offset, or centred
+            if index < len(offsets):
+                i, j = int(offsets[index][0]), int(offsets[index][1])
+            else:
+                i, j = (N - cells.shape[0])//2, (N - cells.shape[1])//2
+            if cells.shape[0] > N or cells.shape[1] > N:
+                print('pattern %s (%d x %d) does not fit the grid' %
+                      (fileName, cells.shape[1], cells.shape[0]))
+                exit(0)
+            seeds.append((i, j, cells))
+
+    # birth/survival rule, e.g. B36/S23 - Conway's B3/S23 by default,
+    # or the rule given in a pattern file
+    rule = CONWAY
+    if args.resume:
+        rule = meta['rule']
+    if fileRule and not args.rule:
+        try:
+            parseRule(fileRule)
+            rule = fileRule
+        except ValueError:
+            print('ignoring pattern rule %s' % fileRule)
+    if args.rule:
+        rule = args.rule
+        try:
+            parseRule(rule)
+        except ValueError as e:
+            print(e)
+            exit(0)
+    if args.resume:
+        kwargs = {'rule': rule}
+        if engineName == 'parallel':
+            kwargs['workers'] = workers
+        engine = restoreEngine(engines[engineName], words, meta, **kwargs)
+        print('resumed at generation %d' % engine.generation)
     else:
-        # populate grid with random on/off - more off than on
-        grid = randomGrid(N)
+        engine = createEngine(engineName, N, seeds, rule, workers)
+
+    # periodic checkpoints, written in the background
+    checkpointer = None
+    if args.checkpoint:
+        every = 1000
+        if args.checkpointEvery:
+            every = int(args.checkpointEvery)
+        try:
+            checkpointer = Checkpointer(args.checkpoint, every, engineName)
+        except ValueError as e:
+            print(e)
+            exit(0)
+
+    # jump ahead before displaying
+    if args.generations:
+        jumpAhead(engine, int(args.generations),
+                  args.onCycle == 'fastforward')
+
+    # run flat out without a display
+    if args.headless:
+        frames = 100
+        if args.frames:
+            frames = int(args.frames)
+        writer = None
+        if args.movfile:
+            writer = PipeWriter(args.movfile, N)
+        elif args.frameDir:
+            writer = FileWriter(args.frameDir, args.frameFormat or 'png')
+        runHeadless(engine, frames, writer, args.onCycle or 'report',
+                    checkpointer)
+        printStats(engine)
+        if checkpointer:
+            # always keep the final state
+            checkpointer.save(engine)
+            checkpointer.close()
+        closeEngine(engine)
+        return
+
+    # OpenGL display - uploads only the parts of the grid that changed
+    if args.display == 'gl':
+        # imported here so that OpenGL is only needed for this display
+        from glview import LifeWindow
+        LifeWindow(engine, checkpointer).run()
+        printStats(engine)
+        if checkpointer:
+            checkpointer.close()
+        closeEngine(engine)
+        return
 
     # set up animation
     fig, ax = plt.subplots()
-    img = ax.imshow(grid, interpolation='nearest')
-    ani = animation.FuncAnimation(fig, update, fargs=(img, grid, N, ),
+    img = ax.imshow(engine.getCells(), interpolation='nearest', 
+                    vmin=0, vmax=1)
+    ani = animation.FuncAnimation(fig, update, 
+                                  fargs=(img, engine, checkpointer, ),
                                   frames = 10,
                                   interval=updateInterval,
                                   save_count=50)
@@ -130,6 +411,9 @@ def main():
         ani.save(args.movfile, fps=30, extra_args=['-vcodec', 'libx264'])
 
     plt.show()
+    if checkpointer:
+        checkpointer.close()
+    closeEngine(engine)
 
 # call main
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+"""
+cycles.py
+
+Author: Mahesh Venkitachalam
+
+Detects when a Game of Life run has become a still life or an
+oscillator, by keeping 64-bit fingerprints of recent generations.
+Engines can provide a cheap fingerprint() of their own; otherwise the
+grid is packed to bits and hashed.
+"""
+
+import hashlib
+from collections import deque
+import numpy as np
+
+def hashBytes(data):
+    """returns a 64-bit hash of a bytes-like object"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          'little')
+
+def fingerprint(engine):
+    """returns a 64-bit fingerprint of the current generation of engine"""
+    if hasattr(engine, 'fingerprint'):
+        return engine.fingerprint()
+    return hashBytes(np.packbits(engine.getCells()))
+
+class CycleDetector:
+    """Detects repeated generations within a window of recent ones"""
+    def __init__(self, window=256):
+        self.window = window
+        # (generation, fingerprint) of recent generations
+        self.history = deque()
+        # latest generation of each fingerprint in the window
+        self.seen = {}
+        self.period = None
+        self.start = None
+
+    def add(self, generation, fp):
+        """records a generation, returns the period once a cycle is found"""
+        if self.period is None:
+            prev = self.seen.get(fp)
+            if prev is not None:
+                # generation repeats the one 'period' generations ago
+                self.period = generation - prev
+                self.start = prev
+        self.history.append((generation, fp))
+        self.seen[fp] = generation
+        if len(self.history) > self.window:
+            gen, old = self.history.popleft()
+            if self.seen.get(old) == gen:
+                del self.seen[old]
+        return self.period
+
+    def describe(self):
+        """returns a description of what was detected"""
+        if self.period is None:
+            return 'no cycle within the last %d generations' % self.window
+        if self.period == 1:
+            return 'still life from generation %d' % self.start
+        return 'oscillator with period %d from generation %d' % \
+            (self.period, self.start)
+
+def skipCycles(engine, detector, remaining):
+    """
+    Given a detected cycle and the number of generations still to run,
+    skips whole periods by advancing the generation count only. Returns
+    the number of generations left to step.
+    """
+    skip = remaining - remaining % detector.period
+    engine.generation += skip
+    return remaining - skip
@@ -0,0 +1,230 @@
+"""
+glview.py
+
+Author: Mahesh Venkitachalam
+
+A fast OpenGL display for the Game of Life. The grid lives in a single
+channel texture of cell values, which the fragment shader maps to
+colors through a 2 entry palette. Each frame only the tiles of the grid
+that changed are uploaded with glTexSubImage2D, and frame rate, step
+time and upload time are shown in the window title.
+
+Needs PyOpenGL, and glutils.py and glfw.py from the common directory.
+"""
+
+import os
+import numpy as np
+import OpenGL
+from OpenGL.GL import *
+
+import glutils
+import glfw
+
+strVS = """
+#version 330 core
+
+layout(location = 0) in vec2 aVert;
+
+out vec2 vTexCoord;
+
+void main() {
+  // full window quad - row 0 of the grid at the top
+  gl_Position = vec4(aVert, 0.0, 1.0);
+  vTexCoord = vec2(aVert.x + 1.0, 1.0 - aVert.y)/2.0;
+}
+"""
+strFS = """
+#version 330 core
+
+in vec2 vTexCoord;
+
+uniform sampler2D cells;
+uniform vec4 palette[2];
+
+out vec4 fragColor;
+
+void main() {
+  // cell values are palette indices
+  float index = texture(cells, vTexCoord).r;
+  fragColor = index > 0.0 ? palette[1] : palette[0];
+}
+"""
+
+def dirtyTiles(prev, cells, tileSize):
+    """returns (r0, c0, r1, c1) of the tiles that differ between grids"""
+    rows, cols = cells.shape
+    nR = (rows + tileSize - 1)//tileSize
+    nC = (cols + tileSize - 1)//tileSize
+    # pad to whole tiles, then reduce the differences per tile
+    diff = np.zeros((nR*tileSize, nC*tileSize), np.bool_)
+    diff[:rows, :cols] = prev != cells
+    changed = diff.reshape(nR, tileSize, nC, tileSize).any(axis=(1, 3))
+    tiles = []
+    for i, j in zip(*np.nonzero(changed)):
+        r0, c0 = int(i)*tileSize, int(j)*tileSize
+        tiles.append((r0, c0, min(rows, r0 + tileSize),
+                      min(cols, c0 + tileSize)))
+    return tiles, changed.size
+
+class LifeWindow:
+    """GLFW window showing a Game of Life engine"""
+    def __init__(self, engine, checkpointer=None, tileSize=64):
+        self.engine = engine
+        self.checkpointer = checkpointer
+        self.tileSize = tileSize
+
+        # save current working directory
+        cwd = os.getcwd()
+
+        # initialize glfw - this changes cwd
+        glfw.glfwInit()
+
+        # restore cwd
+        os.chdir(cwd)
+
+        # version hints
+        glfw.glfwWindowHint(glfw.GLFW_CONTEXT_VERSION_MAJOR, 3)
+        glfw.glfwWindowHint(glfw.GLFW_CONTEXT_VERSION_MINOR, 3)
+        glfw.glfwWindowHint(glfw.GLFW_OPENGL_FORWARD_COMPAT, GL_TRUE)
+        glfw.glfwWindowHint(glfw.GLFW_OPENGL_PROFILE,
+                            glfw.GLFW_OPENGL_CORE_PROFILE)
+
+        # make a window - 4 pixels per cell, within 64 to 800 pixels, so
+        # boards over 800 cells wide get less than a pixel per cell
+        self.width = self.height = max(min(800, 4*engine.N), 64)
+        self.win = glfw.glfwCreateWindow(self.width, self.height, b'conway')
+        # make context current
+        glfw.glfwMakeContextCurrent(self.win)
+        # don't wait for vsync, so the frame rate shows the real cost
+        glfw.glfwSwapInterval(0)
+
+        # initialize GL
+        glViewport(0, 0, self.width, self.height)
+        glClearColor(0.0, 0.0, 0.0, 1.0)
+
+        # set window callbacks
+        glfw.glfwSetKeyCallback(self.win, self.onKeyboard)
+        glfw.glfwSetWindowSizeCallback(self.win, self.onSize)
+
+        # create shader
+        self.program = glutils.loadShaders(strVS, strFS)
+        glUseProgram(self.program)
+        # dark purple for OFF, yellow for ON - like the matplotlib view
+        glUniform4fv(glGetUniformLocation(self.program, b'palette'), 2,
+                     np.array([0.27, 0.0, 0.33, 1.0,
+                               0.99, 0.91, 0.14, 1.0], np.float32))
+
+        # full window quad as a triangle strip
+        vertexData = np.array([-1.0, -1.0, 1.0, -1.0,
+                               -1.0, 1.0, 1.0, 1.0], np.float32)
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        self.vertexBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBufferData(GL_ARRAY_BUFFER, 4*len(vertexData), vertexData,
+                     GL_STATIC_DRAW)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 0, None)
+        glBindVertexArray(0)
+
+        # cell texture - one byte per cell, rows are not padded. Our own
+        # copy of what the texture holds: engines may return their grid,
+        # which they step in place
+        self.cells = np.array(engine.getCells(), np.uint8)
+        rows, cols = self.cells.shape
+        self.texId = glGenTextures(1)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glBindTexture(GL_TEXTURE_2D, self.texId)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_R8, cols, rows, 0, GL_RED,
+                     GL_UNSIGNED_BYTE, self.cells)
+
+        # timing, averaged over each title update
+        self.frames = 0
+        self.stepTime = 0.0
+        self.uploadTime = 0.0
+        self.tilesSent = 0
+        self.tilesTotal = 1
+
+        # exit flag
+        self.exitNow = False
+
+    def onKeyboard(self, win, key, scancode, action, mods):
+        # ESC to quit
+        if action == glfw.GLFW_PRESS and key == glfw.GLFW_KEY_ESCAPE:
+            self.exitNow = True
+
+    def onSize(self, win, width, height):
+        self.width = width
+        self.height = height
+        glViewport(0, 0, self.width, self.height)
+
+    def upload(self):
+        """sends the tiles of the grid that changed to the texture"""
+        cells = np.asarray(self.engine.getCells(), np.uint8)
+        tiles, self.tilesTotal = dirtyTiles(self.cells, cells, self.tileSize)
+        glBindTexture(GL_TEXTURE_2D, self.texId)
+        if len(tiles) > self.tilesTotal//2:
+            # mostly changed - one big upload is cheaper
+            self.cells[:] = cells
+            rows, cols = cells.shape
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, cols, rows, GL_RED,
+                            GL_UNSIGNED_BYTE, self.cells)
+        else:
+            for r0, c0, r1, c1 in tiles:
+                tile = np.ascontiguousarray(cells[r0:r1, c0:c1])
+                self.cells[r0:r1, c0:c1] = tile
+                glTexSubImage2D(GL_TEXTURE_2D, 0, c0, r0, c1 - c0, r1 - r0,
+                                GL_RED, GL_UNSIGNED_BYTE, tile)
+        self.tilesSent += len(tiles)
+
+    def render(self):
+        glClear(GL_COLOR_BUFFER_BIT)
+        glUseProgram(self.program)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.texId)
+        glUniform1i(glGetUniformLocation(self.program, b'cells'), 0)
+        glBindVertexArray(self.vao)
+        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+        glBindVertexArray(0)
+
+    def showStats(self, elapsed):
+        """shows the averaged timings in the window title"""
+        n = max(self.frames, 1)
+        title = ('conway - gen %d - %.1f fps - step %.2f ms - '
+                 'upload %.2f ms (%d of %d tiles/frame)' %
+                 (self.engine.generation, self.frames/elapsed,
+                  1000.0*self.stepTime/n, 1000.0*self.uploadTime/n,
+                  self.tilesSent//n, self.tilesTotal))
+        glfw.glfwSetWindowTitle(self.win, title.encode())
+        self.frames = 0
+        self.stepTime = self.uploadTime = 0.0
+        self.tilesSent = 0
+
+    def run(self):
+        glfw.glfwSetTime(0)
+        t = 0.0
+        while not glfw.glfwWindowShouldClose(self.win) and not self.exitNow:
+            t0 = glfw.glfwGetTime()
+            self.engine.step()
+            if self.checkpointer:
+                self.checkpointer.update(self.engine)
+            t1 = glfw.glfwGetTime()
+            self.upload()
+            t2 = glfw.glfwGetTime()
+            self.render()
+            glfw.glfwSwapBuffers(self.win)
+            glfw.glfwPollEvents()
+            self.stepTime += t1 - t0
+            self.uploadTime += t2 - t1
+            self.frames += 1
+            # update the title twice a second
+            currT = glfw.glfwGetTime()
+            if currT - t > 0.5:
+                self.showStats(currT - t)
+                t = currT
+        # end
+        glfw.glfwTerminate()
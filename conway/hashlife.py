@@ -0,0 +1,243 @@
+"""
+hashlife.py
+
+Author: Mahesh Venkitachalam
+
+Gosper's HashLife algorithm. The grid is stored as a quadtree of
+canonical (hash-consed) nodes, and the future of each node is memoized,
+so repetitive patterns can be advanced by millions of generations.
+
+The board wraps around like the other engines: an NxN torus (N a power
+of 2) is the periodic tiling of its quadtree node.
+"""
+
+import numpy as np
+
+from rules import CONWAY, parseRule
+
+class Node:
+    """Quadtree node covering a 2^level x 2^level square of cells"""
+    __slots__ = ['level', 'nw', 'ne', 'sw', 'se', 'pop', 'key']
+
+    def __init__(self, level, nw, ne, sw, se, pop, key):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        # number of live cells
+        self.pop = pop
+        # structural hash - equal for equal contents, even across gc
+        self.key = key
+
+# the two leaf nodes - single dead and live cells
+OFF_CELL = Node(0, None, None, None, None, 0, 0)
+ON_CELL = Node(0, None, None, None, None, 1, 1)
+
+class HashLifeEngine:
+    """Engine that advances a toroidal grid with HashLife"""
+    def __init__(self, grid, rule=CONWAY, maxNodes=1000000):
+        cells = np.asarray(grid) != 0
+        self.N = cells.shape[0]
+        self.k = self.N.bit_length() - 1
+        if cells.shape != (self.N, self.N) or self.N != 1 << self.k \
+                or self.k < 2:
+            raise ValueError('hashlife needs an NxN grid with N a power '
+                             'of 2 (N >= 4), got %s' % (cells.shape,))
+        self.rule = rule
+        self.birth, self.survive = parseRule(rule)
+        # with B0 rules empty space does not stay empty
+        self.emptyStays = 0 not in self.birth
+        # node cache size that triggers garbage collection
+        self.maxNodes = maxNodes
+        self.table = {}
+        self.memo = {}
+        self.empties = [OFF_CELL]
+        self.tiles = {}
+        self.hits = 0
+        self.misses = 0
+        self.gcRuns = 0
+        self.generation = 0
+        self.root = self.build(cells)
+
+    def join(self, nw, ne, sw, se):
+        """returns the canonical node with the given children"""
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            node = Node(nw.level + 1, nw, ne, sw, se,
+                        nw.pop + ne.pop + sw.pop + se.pop,
+                        hash((nw.level, nw.key, ne.key, sw.key, se.key)))
+            self.table[key] = node
+        return node
+
+    def empty(self, level):
+        """returns the empty node of given level"""
+        while len(self.empties) <= level:
+            e = self.empties[-1]
+            self.empties.append(self.join(e, e, e, e))
+        return self.empties[level]
+
+    def build(self, cells):
+        """builds the quadtree for a square 0/1 array"""
+        size = cells.shape[0]
+        if size == 1:
+            return ON_CELL if cells[0, 0] else OFF_CELL
+        if not cells.any():
+            return self.empty(size.bit_length() - 1)
+        h = size//2
+        return self.join(self.build(cells[:h, :h]), self.build(cells[:h, h:]),
+                         self.build(cells[h:, :h]), self.build(cells[h:, h:]))
+
+    def expand(self, node):
+        """returns the cells of node as a 0/1 uint8 array"""
+        size = 1 << node.level
+        if node.pop == 0:
+            return np.zeros((size, size), np.uint8)
+        if node.level == 0:
+            return np.ones((1, 1), np.uint8)
+        # small tiles repeat a lot, so keep them around
+        tile = self.tiles.get(node)
+        if tile is None:
+            tile = np.vstack([np.hstack([self.expand(node.nw),
+                                         self.expand(node.ne)]),
+                              np.hstack([self.expand(node.sw),
+                                         self.expand(node.se)])])
+            if node.level <= 4:
+                self.tiles[node] = tile
+        return tile
+
+    def centre(self, node):
+        """returns the centre sub-node, one level down"""
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def centreH(self, w, e):
+        """returns the node straddling horizontal neighbors w and e"""
+        return self.join(w.ne, e.nw, w.se, e.sw)
+
+    def centreV(self, n, s):
+        """returns the node straddling vertical neighbors n and s"""
+        return self.join(n.sw, n.se, s.nw, s.ne)
+
+    def life4x4(self, node):
+        """returns the centre 2x2 of a level 2 node after one generation"""
+        c = [[0]*4 for i in range(4)]
+        for (i, j), sub in zip([(0, 0), (0, 2), (2, 0), (2, 2)],
+                               [node.nw, node.ne, node.sw, node.se]):
+            c[i][j], c[i][j+1] = sub.nw.pop, sub.ne.pop
+            c[i+1][j], c[i+1][j+1] = sub.sw.pop, sub.se.pop
+        out = []
+        for i, j in [(1, 1), (1, 2), (2, 1), (2, 2)]:
+            total = (c[i-1][j-1] + c[i-1][j] + c[i-1][j+1] + c[i][j-1] +
+                     c[i][j+1] + c[i+1][j-1] + c[i+1][j] + c[i+1][j+1])
+            # apply birth/survival rules
+            if total in (self.survive if c[i][j] else self.birth):
+                out.append(ON_CELL)
+            else:
+                out.append(OFF_CELL)
+        return self.join(*out)
+
+    def successor(self, node, j):
+        """
+        Given a node of level k >= 2, returns its centre node of level
+        k-1 advanced by 2^j generations, where j <= k-2.
+        """
+        if node.pop == 0 and self.emptyStays:
+            return self.empty(node.level - 1)
+        key = (node, j)
+        result = self.memo.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        if node.level == 2:
+            result = self.life4x4(node)
+        else:
+            # nine overlapping sub-nodes, one level down
+            n00, n02 = node.nw, node.ne
+            n20, n22 = node.sw, node.se
+            n01 = self.centreH(n00, n02)
+            n21 = self.centreH(n20, n22)
+            n10 = self.centreV(n00, n20)
+            n12 = self.centreV(n02, n22)
+            n11 = self.centre(node)
+            if j == node.level - 2:
+                # full speed - two half steps of 2^(j-1) each
+                s = [self.successor(n, j - 1) for n in
+                     [n00, n01, n02, n10, n11, n12, n20, n21, n22]]
+                result = self.join(
+                    self.successor(self.join(s[0], s[1], s[3], s[4]), j - 1),
+                    self.successor(self.join(s[1], s[2], s[4], s[5]), j - 1),
+                    self.successor(self.join(s[3], s[4], s[6], s[7]), j - 1),
+                    self.successor(self.join(s[4], s[5], s[7], s[8]), j - 1))
+            else:
+                # slower step - advance once, then just take centres
+                s = [self.successor(n, j) for n in
+                     [n00, n01, n02, n10, n11, n12, n20, n21, n22]]
+                result = self.join(
+                    self.centre(self.join(s[0], s[1], s[3], s[4])),
+                    self.centre(self.join(s[1], s[2], s[4], s[5])),
+                    self.centre(self.join(s[3], s[4], s[6], s[7])),
+                    self.centre(self.join(s[4], s[5], s[7], s[8])))
+        self.memo[key] = result
+        return result
+
+    def jump(self, j):
+        """advance the torus by 2^j generations"""
+        # tile the torus so the result is at least N away from the edges
+        # and its top left corner lines up with the torus
+        m = max(2, j - self.k + 2)
+        node = self.root
+        for i in range(m):
+            node = self.join(node, node, node, node)
+        node = self.successor(node, j)
+        while node.level > self.k:
+            node = node.nw
+        self.root = node
+        self.generation += 1 << j
+        if len(self.table) > self.maxNodes:
+            self.collect()
+
+    def advance(self, n):
+        """advance the simulation by n generations"""
+        j = 0
+        while n:
+            if n & 1:
+                self.jump(j)
+            n >>= 1
+            j += 1
+
+    def step(self):
+        """advance the simulation by one generation"""
+        self.jump(0)
+
+    def collect(self):
+        """drops all nodes not reachable from the current grid"""
+        self.gcRuns += 1
+        live = {}
+        stack = [self.root] + self.empties[1:]
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key not in live:
+                live[key] = node
+                stack.extend(key)
+        self.table = live
+        # memoized results may refer to dropped nodes
+        self.memo = {}
+        self.tiles = {}
+
+    def stats(self):
+        """returns node cache statistics"""
+        lookups = self.hits + self.misses
+        hitRate = 100.0*self.hits/lookups if lookups else 0.0
+        return {'nodes': len(self.table), 'memo': len(self.memo),
+                'hits': self.hits, 'misses': self.misses,
+                'hitRate': hitRate, 'gcRuns': self.gcRuns}
+
+    def fingerprint(self):
+        """returns a 64-bit fingerprint of the current grid"""
+        return self.root.key
+
+    def getCells(self):
+        """returns the current generation as a 0/1 grid"""
+        return self.expand(self.root)
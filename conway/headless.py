@@ -0,0 +1,97 @@
+"""
+headless.py
+
+Author: Mahesh Venkitachalam
+
+Runs a Game of Life engine without a display, streaming frames to an
+encoder pipe or to a numbered sequence of image/array files.
+"""
+
+import os, time, subprocess
+import numpy as np
+from PIL import Image
+
+from cycles import CycleDetector, fingerprint, skipCycles
+
+class PipeWriter:
+    """Streams frames as raw 8-bit grayscale video into ffmpeg"""
+    def __init__(self, movFile, N, fps=30):
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'gray', '-s', '%dx%d' % (N, N),
+               '-r', str(fps), '-i', '-',
+               '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', movFile]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frameNum, cells):
+        # 0/1 cells to 0/255 gray bytes
+        self.proc.stdin.write((cells*np.uint8(255)).tobytes())
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+class FileWriter:
+    """Writes each frame to a numbered .png or .npy file"""
+    def __init__(self, frameDir, fmt='png'):
+        self.frameDir = frameDir
+        self.fmt = fmt
+        if not os.path.exists(frameDir):
+            os.makedirs(frameDir)
+
+    def write(self, frameNum, cells):
+        fileName = os.path.join(self.frameDir,
+                                'frame_%06d.%s' % (frameNum, self.fmt))
+        if self.fmt == 'npy':
+            np.save(fileName, cells)
+        else:
+            # 1-bit image, which also keeps the files small
+            Image.fromarray(cells.astype(np.bool_)).save(fileName)
+
+    def close(self):
+        pass
+
+def runHeadless(engine, frames, writer=None, onCycle='report',
+                checkpointer=None):
+    """
+    Steps engine for given number of frames, passing each generation to
+    writer if given. Still lifes and oscillators are detected and
+    reported; onCycle 'stop' ends the run when one is found, and
+    'fastforward' skips whole periods of the remaining frames without
+    stepping or writing them. A checkpointer, if given, is updated after
+    every step. Returns generations/second of stepping.
+    """
+    detector = CycleDetector()
+    detector.add(engine.generation, fingerprint(engine))
+    stepTime = 0.0
+    steps = 0
+    start = time.time()
+    startGen = engine.generation
+    frameNum = 0
+    while frameNum < frames:
+        t0 = time.time()
+        engine.step()
+        stepTime += time.time() - t0
+        steps += 1
+        if checkpointer:
+            checkpointer.update(engine)
+        if writer:
+            writer.write(frameNum, engine.getCells())
+        frameNum += 1
+        if detector.period is None and \
+                detector.add(engine.generation, fingerprint(engine)):
+            if onCycle == 'stop':
+                break
+            if onCycle == 'fastforward':
+                left = skipCycles(engine, detector, frames - frameNum)
+                frameNum = frames - left
+    if writer:
+        writer.close()
+    totalTime = time.time() - start
+    # guard against timer resolution on tiny runs
+    stepRate = steps/max(stepTime, 1e-9)
+    print('%d generations (%d stepped) in %.3f s: %.1f generations/s '
+          'overall, %.1f generations/s stepping' %
+          (engine.generation - startGen, steps, totalTime,
+           steps/max(totalTime, 1e-9), stepRate))
+    print(detector.describe())
+    return stepRate
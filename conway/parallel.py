@@ -0,0 +1,136 @@
+"""
+parallel.py
+
+Author: Mahesh Venkitachalam
+
+Steps a bit-packed Game of Life grid on several cores. The grid is split
+into row bands, each stepped by a worker process. Both generations live
+in shared memory, so each step only sends the band limits to the workers
+- the halo rows above and below a band (wrapping around at the top and
+bottom) are read straight from the shared grid.
+
+Run this file directly for a scaling benchmark.
+"""
+
+import os, time, argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from bitlife import BitEngine, stepRows
+from rules import CONWAY
+
+# worker process state - the two shared generations
+workerBlocks = []
+workerGrids = []
+
+def attachWorker(names, shape):
+    """pool initializer - attaches the shared grids"""
+    for name in names:
+        shm = shared_memory.SharedMemory(name=name)
+        workerBlocks.append(shm)
+        workerGrids.append(np.ndarray(shape, '<u8', buffer=shm.buf))
+
+def stepWorker(task):
+    """steps rows r0..r1-1 from shared grid src into the other one"""
+    src, r0, r1, N, counts = task
+    stepRows(workerGrids[src], workerGrids[1 - src], N, r0, r1, counts)
+
+class ParallelEngine(BitEngine):
+    """Bit-packed engine that steps row bands on a process pool"""
+    def __init__(self, grid, rule=CONWAY, workers=None):
+        BitEngine.__init__(self, grid, rule)
+        if not workers:
+            workers = os.cpu_count()
+        self.workers = workers
+        self.pool = None
+        self.blocks = []
+        self.src = 0
+
+    def start(self):
+        """moves the grid into shared memory and starts the workers"""
+        shape = self.words.shape
+        size = max(1, self.words.nbytes)
+        self.blocks = [shared_memory.SharedMemory(create=True, size=size)
+                       for i in range(2)]
+        grids = [np.ndarray(shape, '<u8', buffer=shm.buf)
+                 for shm in self.blocks]
+        grids[0][:] = self.words
+        self.words, self.out = grids
+        self.src = 0
+        # split rows into one band per worker
+        rows = shape[0]
+        edges = np.linspace(0, rows, self.workers + 1).astype(int)
+        self.bands = [(r0, r1) for r0, r1 in zip(edges[:-1], edges[1:])
+                      if r1 > r0]
+        self.pool = mp.Pool(self.workers, initializer=attachWorker,
+                            initargs=([shm.name for shm in self.blocks], shape))
+
+    def step(self):
+        """advance the simulation by one generation"""
+        if self.pool is None:
+            self.start()
+        tasks = [(self.src, r0, r1, self.N, self.counts)
+                 for r0, r1 in self.bands]
+        self.pool.map(stepWorker, tasks, chunksize=1)
+        self.src = 1 - self.src
+        self.words, self.out = self.out, self.words
+        self.generation += 1
+
+    def close(self):
+        """stops the workers and releases the shared memory"""
+        if self.pool is None:
+            return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+        # keep a private copy of the grid
+        self.words = self.words.copy()
+        self.out = np.empty_like(self.words)
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+def benchmark(N, maxWorkers, steps):
+    """prints step time and speedup of an NxN grid for 1..maxWorkers"""
+    print('grid: %d x %d, %d steps per run' % (N, N, steps))
+    np.random.seed(0)
+    base = None
+    for workers in range(1, maxWorkers + 1):
+        engine = ParallelEngine.random(N, workers=workers)
+        # first step starts the pool
+        engine.step()
+        start = time.time()
+        for i in range(steps):
+            engine.step()
+        stepTime = (time.time() - start)/steps
+        engine.close()
+        if base is None:
+            base = stepTime
+        print('workers: %2d, step: %.4f s, speedup: %.2f, efficiency: %.2f' %
+              (workers, stepTime, base/stepTime, base/stepTime/workers))
+
+# main() function
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks multi-core "
+                                     "Game of Life stepping.")
+    parser.add_argument('--grid-size', dest='N', required=False)
+    parser.add_argument('--max-workers', dest='maxWorkers', required=False)
+    parser.add_argument('--steps', dest='steps', required=False)
+    args = parser.parse_args()
+
+    N = 20000
+    if args.N:
+        N = int(args.N)
+    maxWorkers = os.cpu_count()
+    if args.maxWorkers:
+        maxWorkers = int(args.maxWorkers)
+    steps = 10
+    if args.steps:
+        steps = int(args.steps)
+    benchmark(N, maxWorkers, steps)
+
+# call main
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+patterns.py
+
+Author: Mahesh Venkitachalam
+
+Loads Game of Life patterns from RLE (.rle) and Life 1.06 (.lif, .life)
+files. Files are parsed a line at a time into runs of live cells, which
+are then expanded with numpy. Parsed patterns are cached on disk as
+1-bit packed arrays, so big catalog patterns reload instantly.
+"""
+
+import os, re, hashlib
+from array import array
+import numpy as np
+
+# parsed patterns are cached here
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'conway-patterns')
+
+# <count><tag> items of RLE pattern data
+rleItem = re.compile(r'(\d*)([a-zA-Z$!])')
+# key = value fields of the RLE header line
+rleField = re.compile(r'(\w+)\s*=\s*([^,\s]+)')
+
+def runsToCells(ys, xs, ns, h, w):
+    """expands runs of ns live cells starting at (ys, xs) into a 0/1 array"""
+    cells = np.zeros((h, w), np.uint8)
+    ys = np.frombuffer(ys, np.int32)
+    xs = np.frombuffer(xs, np.int32)
+    ns = np.frombuffer(ns, np.int32)
+    if len(ns):
+        # position of each cell within its run
+        starts = np.cumsum(ns) - ns
+        steps = np.arange(ns.sum()) - np.repeat(starts, ns)
+        cells[np.repeat(ys, ns), np.repeat(xs, ns) + steps] = 1
+    return cells
+
+def readRLE(f):
+    """parses RLE pattern lines, returns (cells, rule)"""
+    rule = None
+    w = h = 0
+    x = y = 0
+    # live cell runs, kept as compact int arrays
+    ys, xs, ns = array('i'), array('i'), array('i')
+    done = False
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('x'):
+            # header, e.g. x = 36, y = 9, rule = B3/S23
+            for key, val in rleField.findall(line):
+                if key == 'x':
+                    w = int(val)
+                elif key == 'y':
+                    h = int(val)
+                elif key == 'rule':
+                    # drop any :T<w>,<h> topology suffix
+                    rule = val.split(':')[0]
+            continue
+        for count, tag in rleItem.findall(line):
+            n = int(count) if count else 1
+            if tag == 'b':
+                x += n
+            elif tag == '$':
+                x = 0
+                y += n
+            elif tag == '!':
+                done = True
+                break
+            else:
+                # 'o' - or any other state, all taken as live
+                ys.append(y)
+                xs.append(x)
+                ns.append(n)
+                x += n
+                w = max(w, x)
+                h = max(h, y + 1)
+        if done:
+            break
+    return runsToCells(ys, xs, ns, h, w), rule
+
+def readLife106(f):
+    """parses Life 1.06 lines of 'x y' cell coordinates, returns cells"""
+    xy = np.loadtxt(f, dtype=np.int64, comments='#', ndmin=2)
+    if xy.size == 0:
+        return np.zeros((0, 0), np.uint8)
+    # coordinates can be negative - move the bounding box to (0, 0)
+    xy -= xy.min(axis=0)
+    w, h = xy.max(axis=0) + 1
+    cells = np.zeros((h, w), np.uint8)
+    cells[xy[:, 1], xy[:, 0]] = 1
+    return cells
+
+def cachePath(fileName, cacheDir):
+    """returns the cache file for a pattern file"""
+    key = hashlib.sha1(os.path.abspath(fileName).encode()).hexdigest()
+    return os.path.join(cacheDir, key + '.npz')
+
+def loadPattern(fileName, cacheDir=CACHE_DIR):
+    """
+    Returns (cells, rule) for a pattern file, where cells is a 0/1 uint8
+    array of the bounding box and rule is a B/S string or None.
+    Pass cacheDir=None to skip the on-disk cache.
+    """
+    st = os.stat(fileName)
+    # the cache is valid for the same file size and modification time
+    stamp = np.array([st.st_size, st.st_mtime_ns], np.int64)
+    if cacheDir:
+        cacheFile = cachePath(fileName, cacheDir)
+        if os.path.exists(cacheFile):
+            with np.load(cacheFile) as data:
+                if np.array_equal(data['stamp'], stamp):
+                    h, w = data['shape']
+                    cells = np.unpackbits(data['bits'], count=h*w)
+                    rule = str(data['rule']) or None
+                    return cells.reshape(h, w), rule
+    ext = os.path.splitext(fileName)[1].lower()
+    with open(fileName) as f:
+        if ext == '.rle':
+            cells, rule = readRLE(f)
+        elif ext in ['.lif', '.life']:
+            cells, rule = readLife106(f), None
+        else:
+            raise ValueError('unknown pattern format: %s' % fileName)
+    if cacheDir:
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+        # write to a temporary file first so readers never see half a file
+        tmpFile = cacheFile + '.tmp.npz'
+        np.savez(tmpFile, stamp=stamp, shape=np.array(cells.shape),
+                 bits=np.packbits(cells, axis=None), rule=rule or '')
+        os.replace(tmpFile, cacheFile)
+    return cells, rule
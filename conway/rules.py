@@ -0,0 +1,76 @@
+"""
+rules.py
+
+Author: Mahesh Venkitachalam
+
+Life-like (outer totalistic) rules in B/S notation. 'B36/S23' means a
+dead cell is born with 3 or 6 live neighbors, and a live cell survives
+with 2 or 3 live neighbors.
+"""
+
+import numpy as np
+
+# Conway's Game of Life
+CONWAY = 'B3/S23'
+
+# some well known rules
+namedRules = {'life': CONWAY, 'highlife': 'B36/S23', 'seeds': 'B2/S',
+              'daynight': 'B3678/S34678'}
+
+def parseRule(rule):
+    """returns (birth, survive) neighbor counts of a B/S rule string"""
+    rule = namedRules.get(rule.lower(), rule)
+    parts = rule.upper().replace(' ', '').split('/')
+    if len(parts) != 2 or not parts[0].startswith('B') \
+            or not parts[1].startswith('S'):
+        raise ValueError('rule must look like B3/S23, got %r' % rule)
+    counts = []
+    for part in parts:
+        digits = part[1:]
+        if not all(d in '012345678' for d in digits):
+            raise ValueError('bad neighbor counts in rule %r' % rule)
+        counts.append(tuple(sorted(set(int(d) for d in digits))))
+    return tuple(counts)
+
+def ruleString(birth, survive):
+    """returns the B/S string of given neighbor counts"""
+    return 'B%s/S%s' % (''.join(map(str, birth)), ''.join(map(str, survive)))
+
+def ruleTable(rule):
+    """
+    Returns a lookup table of next cell values, indexed by
+    cell*10 + (sum of the 3x3 block around the cell, cell included).
+    """
+    birth, survive = parseRule(rule)
+    table = np.zeros(20, np.uint8)
+    for n in birth:
+        table[n] = 1
+    # for live cells the block sum counts the cell too
+    for n in survive:
+        table[10 + n + 1] = 1
+    return table
+
+def ruleRanges(table):
+    """
+    Compiles a rule table into runs (lo, hi) of consecutive table
+    indices whose next value is ON - a few array compares are much
+    faster than an element-wise table lookup.
+    """
+    ranges = []
+    for index in np.nonzero(table)[0]:
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1] = (ranges[-1][0], int(index))
+        else:
+            ranges.append((int(index), int(index)))
+    return ranges
+
+def applyRule(index, ranges):
+    """returns the next 0/1 cell values for a uint8 array of table indices"""
+    out = np.zeros(index.shape, np.bool_)
+    for lo, hi in ranges:
+        if lo == hi:
+            out |= index == lo
+        else:
+            # uint8 wraps around below lo, so one compare checks both ends
+            out |= (index - np.uint8(lo)) <= hi - lo
+    return out.view(np.uint8)
@@ -0,0 +1,104 @@
+"""
+sparselife.py
+
+Author: Mahesh Venkitachalam
+
+A Game of Life engine that only recomputes the parts of the grid that
+can change. The grid is split into square tiles, and a tile is
+recomputed only if it or one of its 8 neighbors changed in the last
+generation - so the cost follows the activity of the pattern rather
+than the size of the board.
+"""
+
+import numpy as np
+
+from rules import CONWAY, ruleTable, ruleRanges, applyRule
+
+class SparseEngine:
+    """Engine that steps only the active tiles of a 0/1 uint8 grid"""
+    def __init__(self, grid, rule=CONWAY, tileSize=32):
+        self.cells = (np.asarray(grid) != 0).astype(np.uint8)
+        self.N = self.cells.shape[0]
+        self.rule = rule
+        self.ranges = ruleRanges(ruleTable(rule))
+        self.generation = 0
+        T = min(tileSize, self.N)
+        self.tileSize = T
+        nTiles = (self.N + T - 1)//T
+        # row/col indices of each tile plus a 1 cell halo, wrapped around;
+        # a partial last tile wraps onto the first one, which is harmless
+        # since those cells are computed from their true neighbors
+        self.index = (np.arange(nTiles)[:, None]*T - 1 +
+                      np.arange(T + 2)[None, :]) % self.N
+        # random odd keys per row and column: the fingerprint of the grid
+        # is the sum of rowKey*colKey over live cells, mod 2^64, and is
+        # updated from the tiles that change
+        rng = np.random.default_rng(1)
+        rowKey = rng.integers(0, 2**63, self.N, dtype=np.uint64)*2 + 1
+        colKey = rng.integers(0, 2**63, self.N, dtype=np.uint64)*2 + 1
+        ys, xs = np.nonzero(self.cells)
+        self.hash = int(np.sum(rowKey[ys]*colKey[xs]))
+        # keys of the inner cells of each tile - zero for cells that
+        # wrap around, so they are not counted twice
+        inner = np.arange(nTiles)[:, None]*T + np.arange(T)[None, :]
+        valid = inner < self.N
+        self.rowKeys = np.where(valid, rowKey[inner % self.N], 0)
+        self.colKeys = np.where(valid, colKey[inner % self.N], 0)
+        # every tile is active to begin with
+        self.active = np.ones((nTiles, nTiles), np.bool_)
+        self.tilesTouched = 0
+        self.tilesChanged = 0
+        self.totalTouched = 0
+
+    def step(self):
+        """advance the simulation by one generation"""
+        ti, tj = np.nonzero(self.active)
+        self.tilesTouched = len(ti)
+        self.totalTouched += len(ti)
+        self.generation += 1
+        if len(ti) == 0:
+            # nothing changed last time, so nothing can change now
+            self.tilesChanged = 0
+            return
+        # gather active tiles with halos into a (tiles, T+2, T+2) stack
+        rows = self.index[ti][:, :, None]
+        cols = self.index[tj][:, None, :]
+        block = self.cells[rows, cols]
+        # 3x3 block sums of the inner cells
+        vert = block[:, :-2] + block[:, 1:-1] + block[:, 2:]
+        total = vert[:, :, :-2] + vert[:, :, 1:-1] + vert[:, :, 2:]
+        centre = block[:, 1:-1, 1:-1]
+        # apply the rule for each cell state and block sum
+        new = applyRule(total + centre*np.uint8(10), self.ranges)
+        # inputs were all gathered above, so write back in place
+        self.cells[rows[:, 1:-1], cols[:, :, 1:-1]] = new
+        # tiles that changed and their neighbors are active next time
+        changed = np.zeros_like(self.active)
+        tileChanged = (new != centre).any(axis=(1, 2))
+        changed[ti, tj] = tileChanged
+        # update the fingerprint from the changed tiles
+        k = np.nonzero(tileChanged)[0]
+        if len(k):
+            diff = (new[k].astype(np.int64) - centre[k]).astype(np.uint64)
+            delta = np.einsum('kr,krc,kc->', self.rowKeys[ti[k]], diff,
+                              self.colKeys[tj[k]])
+            self.hash = (self.hash + int(delta)) & 0xFFFFFFFFFFFFFFFF
+        self.tilesChanged = int(changed.sum())
+        vert = (changed | np.roll(changed, 1, axis=0) | 
+                np.roll(changed, -1, axis=0))
+        self.active = (vert | np.roll(vert, 1, axis=1) | 
+                       np.roll(vert, -1, axis=1))
+
+    def stats(self):
+        """returns tile activity counts"""
+        return {'tiles': self.active.size, 'tilesTouched': self.tilesTouched,
+                'tilesChanged': self.tilesChanged,
+                'totalTouched': self.totalTouched}
+
+    def fingerprint(self):
+        """returns a 64-bit fingerprint of the current grid"""
+        return self.hash
+
+    def getCells(self):
+        """returns the current generation as a 0/1 grid"""
+        return self.cells
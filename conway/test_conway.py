@@ -0,0 +1,204 @@
+"""
+test_conway.py
+
+Correctness tests for the Game of Life step engines.
+
+Author: Mahesh Venkitachalam
+"""
+
+import pytest
+import numpy as np
+import conway
+import bitlife
+import hashlife
+import patterns
+
+def runEngines(grid, generations, engineNames, rule=conway.CONWAY):
+    """steps each named engine and checks them against the reference"""
+    ref = conway.LoopEngine(grid, rule)
+    others = [conway.engines[name](grid, rule) for name in engineNames]
+    for gen in range(generations):
+        ref.step()
+        for engine in others:
+            engine.step()
+            assert np.array_equal(engine.getCells(), ref.getCells()), \
+                'generation %d differs' % (gen + 1)
+
+def test_random():
+    np.random.seed(1)
+    runEngines(conway.randomGrid(32), 60, ['numpy', 'bits', 'hashlife', 'sparse'])
+
+def test_glider():
+    grid = np.zeros(16*16).reshape(16, 16)
+    conway.addGlider(1, 1, grid)
+    # 80 generations moves the glider across the wrap-around edges
+    runEngines(grid, 80, ['numpy', 'bits', 'hashlife', 'sparse'])
+
+def test_gosper():
+    grid = np.zeros(64*64).reshape(64, 64)
+    conway.addGosperGliderGun(10, 10, grid)
+    runEngines(grid, 60, ['numpy', 'bits', 'hashlife', 'sparse'])
+
+def test_bits_wide():
+    # word-aligned and unaligned rows, checked against the numpy engine
+    np.random.seed(2)
+    for N in [64, 128, 130]:
+        grid = conway.randomGrid(N)
+        ref = conway.NumpyEngine(grid)
+        engine = bitlife.BitEngine(grid)
+        for gen in range(40):
+            ref.step()
+            engine.step()
+            assert np.array_equal(engine.getCells(), ref.getCells())
+
+def test_bits_pack():
+    np.random.seed(3)
+    cells = conway.gridToCells(conway.randomGrid(100))
+    words = bitlife.packCells(cells)
+    assert words.shape == (100, 2)
+    assert np.array_equal(bitlife.unpackWords(words, 100), cells)
+
+def test_hashlife_jump():
+    # jumps of many sizes, with a node cache small enough to force gc
+    grid = np.zeros((128, 128), np.uint8)
+    conway.addGosperGliderGun(10, 10, grid)
+    engine = hashlife.HashLifeEngine(grid, maxNodes=2000)
+    ref = conway.NumpyEngine(grid)
+    for n in [1, 7, 64, 300, 1000]:
+        engine.advance(n)
+        for i in range(n):
+            ref.step()
+        assert np.array_equal(engine.getCells(), ref.getCells())
+    assert engine.generation == 1372
+    assert engine.stats()['gcRuns'] > 0
+
+def test_sparse_tiles():
+    # a glider on a big board keeps only a few tiles busy
+    grid = np.zeros((250, 250), np.uint8)
+    conway.addGlider(1, 1, grid)
+    engine = conway.SparseEngine(grid, tileSize=16)
+    ref = conway.NumpyEngine(grid)
+    for gen in range(300):
+        engine.step()
+        ref.step()
+        assert np.array_equal(engine.getCells(), ref.getCells())
+    assert engine.stats()['tilesTouched'] <= 16
+
+def test_headless_frames(tmp_path):
+    grid = np.zeros((32, 32), np.uint8)
+    conway.addGlider(1, 1, grid)
+    writer = conway.FileWriter(str(tmp_path), 'npy')
+    conway.runHeadless(conway.NumpyEngine(grid), 4, writer)
+    ref = conway.NumpyEngine(grid)
+    for frameNum in range(4):
+        ref.step()
+        frame = np.load(str(tmp_path / ('frame_%06d.npy' % frameNum)))
+        assert np.array_equal(frame, ref.getCells())
+
+def test_parallel():
+    # uneven bands, each with halo rows read across the band edges
+    np.random.seed(4)
+    grid = conway.randomGrid(100)
+    engine = conway.ParallelEngine(grid, workers=3)
+    ref = conway.NumpyEngine(grid)
+    try:
+        for gen in range(30):
+            engine.step()
+            ref.step()
+            assert np.array_equal(engine.getCells(), ref.getCells())
+    finally:
+        engine.close()
+    assert np.array_equal(engine.getCells(), ref.getCells())
+
+def test_rules():
+    assert conway.parseRule('b36/s23') == ((3, 6), (2, 3))
+    assert conway.parseRule('seeds') == ((2,), ())
+    np.random.seed(5)
+    grid = conway.randomGrid(32)
+    for rule in ['B36/S23', 'B2/S', 'B3678/S34678', 'B0/S8']:
+        runEngines(grid, 20, ['numpy', 'bits', 'hashlife', 'sparse'], rule)
+
+GOSPER_RLE = """#N Gosper glider gun
+x = 36, y = 9, rule = B3/S23
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4b
+obo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+def test_patterns(tmp_path):
+    gun = np.zeros((11, 38), np.uint8)
+    conway.addGosperGliderGun(0, 0, gun)
+    gun = conway.gridToCells(gun)[1:10, 1:37]
+    rleFile = tmp_path / 'gosper.rle'
+    rleFile.write_text(GOSPER_RLE)
+    lifeFile = tmp_path / 'gosper.lif'
+    ys, xs = np.nonzero(gun)
+    lifeFile.write_text('#Life 1.06\n' + ''.join(
+        ['%d %d\n' % (x - 5, y - 3) for y, x in zip(ys, xs)]))
+    cacheDir = str(tmp_path / 'cache')
+    for fileName in [str(rleFile), str(lifeFile)]:
+        # parse, then read back from the cache
+        for i in range(2):
+            cells, rule = patterns.loadPattern(fileName, cacheDir)
+            assert np.array_equal(cells, gun)
+    assert rule is None
+    assert patterns.loadPattern(str(rleFile), cacheDir)[1] == 'B3/S23'
+
+def test_cycles():
+    # a blinker and a block: period 2 from the first generation
+    grid = np.zeros((32, 32), np.uint8)
+    grid[5, 5:8] = conway.ON
+    grid[20:22, 20:22] = conway.ON
+    for name in ['numpy', 'bits', 'hashlife', 'sparse']:
+        engine = conway.engines[name](grid)
+        detector = conway.CycleDetector()
+        detector.add(engine.generation, conway.fingerprint(engine))
+        for gen in range(4):
+            engine.step()
+            detector.add(engine.generation, conway.fingerprint(engine))
+        assert (detector.period, detector.start) == (2, 0), name
+    # grids that differ only in the top bits of words hash apart
+    fps = set()
+    for cols in [[], [63], [127], [63, 127]]:
+        engine = conway.engines['bits'](np.zeros((8, 128), np.uint8))
+        for c in cols:
+            engine.paste(0, c, [[1]])
+        fps.add(engine.fingerprint())
+    assert len(fps) == 4
+    # fast-forwarding lands on the same grid as stepping all the way
+    engine = conway.SparseEngine(grid)
+    conway.jumpAhead(engine, 1001, fastForward=True)
+    assert engine.generation == 1001
+    assert engine.getCells()[4:7, 6].all()
+
+def test_checkpoint(tmp_path):
+    np.random.seed(6)
+    engine = conway.createEngine('bits', 130, rule='B36/S23')
+    for gen in range(25):
+        engine.step()
+    ckptFile = str(tmp_path / 'run.ckpt')
+    checkpointer = conway.Checkpointer(ckptFile, 10, 'bits')
+    checkpointer.save(engine)
+    checkpointer.close()
+    state = np.random.rand()
+    words, meta = conway.readCheckpoint(ckptFile)
+    assert (meta['generation'], meta['rule']) == (25, 'B36/S23')
+    resumed = [conway.restoreEngine(conway.engines[name], words, meta,
+                                    rule=meta['rule'])
+               for name in ['bits', 'numpy']]
+    # the RNG continues where the checkpoint left it
+    assert np.random.rand() == state
+    for gen in range(10):
+        engine.step()
+        for other in resumed:
+            other.step()
+            assert other.generation == engine.generation
+            assert np.array_equal(other.getCells(), engine.getCells())
+    # a checkpoint that can't be written is reported, not hung on
+    with pytest.raises(ValueError):
+        conway.Checkpointer(str(tmp_path / 'missing' / 'run.ckpt'), 1, 'bits')
+    (tmp_path / 'taken').mkdir()
+    checkpointer = conway.Checkpointer(str(tmp_path / 'taken'), 1, 'bits')
+    with pytest.raises(OSError):
+        for gen in range(5):
+            checkpointer.save(engine)
+        checkpointer.close()
@@ -11,6 +11,11 @@ from PIL import Image
 import imghdr
 import numpy as np
 
+# summed-area tables, from the common directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import tilestats
+
 def getAverageRGBOld(image):
   """
   Given PIL Image, return average value of color as (r, g, b)
@@ -143,37 +148,50 @@ def createImageGrid(images, dims):
   return grid_img
 
 
+def getTileAverages(stats, size):
+  """
+  Given TileStats of an image and dims (rows, cols), returns the
+  average (r, g, b) of each tile of splitImage(), in the same order
+  """
+  m, n = size
+  w, h = int(stats.W/n), int(stats.H/m)
+  # tile edges - like splitImage, leftover pixels are not used
+  xs = np.arange(n + 1)*w
+  ys = np.arange(m + 1)*h
+  return [tuple(avg) for avg in stats.gridMeans(xs, ys).reshape(m*n, -1)]
+
 def createPhotomosaic(target_image, input_images, grid_size,
-                      reuse_images=True):
+                      reuse_images=True, stats=None):
   """
-  Creates photomosaic given target and input images.
+  Creates photomosaic given target and input images. stats are the
+  TileStats of the target image, built here if not given.
   """
 
-  print('splitting input image...')
-  # split target image 
-  target_images = splitImage(target_image, grid_size)
+  print('averaging target image tiles...')
+  # average all target tiles from the summed-area table
+  if stats is None:
+    stats = tilestats.TileStats(np.asarray(target_image.convert('RGB')))
+  target_avgs = getTileAverages(stats, grid_size)
 
   print('finding image matches...')
   # for each target image, pick one from input
   output_images = []
   # for user feedback
   count = 0
-  batch_size = int(len(target_images)/10)
+  batch_size = int(len(target_avgs)/10)
 
   # calculate input image averages
   avgs = []
   for img in input_images:
     avgs.append(getAverageRGB(img))
 
-  for img in target_images:
-    # target sub-image average
-    avg = getAverageRGB(img)
+  for avg in target_avgs:
     # find match index
     match_index = getBestMatchIndex(avg, avgs)
     output_images.append(input_images[match_index])
     # user feedback
     if count > 0 and batch_size > 10 and count % batch_size is 0:
-      print('processed %d of %d...' %(count, len(target_images)))
+      print('processed %d of %d...' %(count, len(target_avgs)))
     count += 1
     # remove selected image from input if flag set
     if not reuse_images:
@@ -198,6 +216,7 @@ def main():
   parser.add_argument('--input-folder', dest='input_folder', required=True)
   parser.add_argument('--grid-size', nargs=2, dest='grid_size', required=True)
   parser.add_argument('--output-file', dest='outfile', required=False)
+  parser.add_argument('--no-cache', dest='noCache', action='store_true')
 
   args = parser.parse_args()
 
@@ -205,6 +224,9 @@ def main():
 
   # target image
   target_image = Image.open(args.target_image)
+  # its summed-area table, cached so other grid sizes reuse it
+  cacheDir = None if args.noCache else tilestats.CACHE_DIR
+  stats = tilestats.loadTileStats(args.target_image, 'RGB', cacheDir)
 
   # input images
   print('reading input folder...')
@@ -255,7 +277,7 @@ def main():
 
   # create photomosaic
   mosaic_image = createPhotomosaic(target_image, input_images, grid_size,
-                                   reuse_images)
+                                   reuse_images, stats)
 
   # write out mosaic
   mosaic_image.save(output_filename, 'PNG')